@@ -1,123 +1,157 @@
-from settings import BoardPosition
+from pieces import *
+from evaluation import MATERIAL_VALUES
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from ordering import MoveOrderer
+from book import OpeningBook
+from stats import SearchStats
+from moves import *
+from bitbase import Bitbases, default_bitbases, WIN, DRAW, LOSS
 import random
+import time
+from collections.abc import Callable
+
+MATE_SCORE = 100000  # checkmate at the root, mates found further from the root score slightly less
+MATE_THRESHOLD = MATE_SCORE - 1000  # scores beyond this are mates
+KNOWN_WIN_SCORE = 20000  # positions the bitbases say are won, more than any evaluation but less than a mate
+INFINITY = 1000000  # bound for the alpha-beta window, larger than any score
+MAX_DEPTH = 64  # deepest iteration of a search limited only by time or nodes
+ASPIRATION_WINDOW = 50  # half-width of the first window around the previous iteration's score
+DELTA_MARGIN = 200  # safety margin of delta pruning, for positional gains a capture might bring on top of material
+LIMIT_CHECK_INTERVAL = 1024  # nodes between checks of the time and node limits (must be a power of two)
+NULL_MOVE_REDUCTION = 2  # how much shallower than usual the search after a null move is, 3 from depth 6 up
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3  # late move reductions are only made with at least this much depth left
+LMR_FULL_DEPTH_MOVES = 3  # moves searched to full depth before quiet moves start being reduced
+LMR_LATE_MOVES = 8  # from depth 6, moves after this many are reduced by two plies instead of one
+FUTILITY_MARGINS = (0, 200, 500)  # by remaining depth, how far below alpha a position must be for its quiet moves
+# to be skipped
+
 
 class AI:
-    def __init__(self, colour: str, depth: int, engine):
+    def __init__(self, colour: str, depth: int, engine, hash_size_mb: float = 16, time_limit: float | None = None,
+                 node_limit: int | None = None, quiescence_depth: int = 8, book: OpeningBook | None = None,
+                 use_bitbases: bool = True, null_move: bool = True, late_move_reductions: bool = True,
+                 futility_pruning: bool = True):
         self.colour = colour
-        self.depth = depth
+        self.depth = depth  # maximum depth, the search may stop sooner if it has a time or node limit
         self.engine = engine
+        self.time_limit = time_limit  # seconds per move
+        self.node_limit = node_limit
+        self.quiescence_depth = quiescence_depth  # maximum captures searched beyond the horizon, 0 to disable
+        self.book = book  # book moves are played without searching
+        # Known results of endgames with a king and one piece against a king, see bitbase.py
+        self.bitbases: Bitbases | None = default_bitbases() if use_bitbases else None
+        # Selective search, each of which can be turned off on its own to compare the AI with and without it
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        # Results are kept between iterative deepening passes and between moves
+        self.transposition_table = TranspositionTable(hash_size_mb)
+        self.move_orderer = MoveOrderer()
+        self.stop_requested = False  # set from another thread to abandon the current search
+        self.stop_event = None  # optionally an event shared with other processes that also stops the search
+        self.root_ply = 0  # length of the engine's move log when the current search started
+        self.root_piece_count = 32
+        self.nodes = 0  # all nodes of the current search, including quiescence nodes
+        self.quiescence_nodes = 0
+        self.deadline: float | None = None
+        self.max_nodes: int | None = None
+        self.best_score = 0  # score of the last completed iteration
+        self.stats: SearchStats | None = None  # only collected when asked for, see get_best_move
+        # Called with the depth, score and best move after each completed iteration, e.g. to report progress
+        self.on_iteration: Callable[[int, int, int | None], None] | None = None
+        self.completed_depth = 0
+
+    def stop(self):
+        """Asks a search running in another thread to finish as soon as possible. The flag stays set until the
+        caller clears it before the next search
+        """
+        self.stop_requested = True
+
+    def evaluate_board(self) -> int:
+        # The engine keeps the material and square score up to date as moves are made, see evaluation.py
+        return self.engine.score
+
+    def negamax(self, depth: int, alpha: int, beta: int, turn_multiplier: int,
+                ply: int = 0) -> tuple[int, int | None]:
+        if ply > 0 and self.engine.piece_count <= 3 and self.bitbases is not None:
+            score = self.probe_bitbases(depth, ply)
+            if score is not None:
+                return score, None
 
-        # Piece square tables
-        pawn_scores = [
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
-            [0.1, 0.1, 0.2, 0.3, 0.3, 0.2, 0.1, 0.1],
-            [0.05, 0.05, 0.1, 0.25, 0.25, 0.1, 0.05, 0.05],
-            [0, 0, 0, 0.2, 0.2, 0, 0, 0],
-            [0.05, -0.05, -0.1, 0, 0, -0.1, -0.05, 0.05],
-            [0.05, 0.1, 0.1, -0.2, -0.2, 0.1, 0.1, 0.05],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ]
-
-        knight_scores = [
-            [-0.5, -0.4, -0.3, -0.3, -0.3, -0.3, -0.4, -0.5],
-            [-0.4, -0.2, 0, 0, 0, 0, -0.2, -0.4],
-            [-0.3, 0, 0.1, 0.15, 0.15, 0.1, 0, -0.3],
-            [-0.3, 0.05, 0.15, 0.2, 0.2, 0.15, 0.05, -0.3],
-            [-0.3, 0, 0.15, 0.2, 0.2, 0.15, 0, -0.3],
-            [-0.3, 0.05, 0.1, 0.15, 0.15, 0.1, 0.05, -0.3],
-            [-0.4, -0.2, 0, 0.05, 0.05, 0, -0.2, -0.4],
-            [-0.5, -0.4, -0.3, -0.3, -0.3, -0.3, -0.4, -0.5]
-        ]
-
-        bishop_scores = [
-            [-0.2, -0.1, -0.1, -0.1, -0.1, -0.1, -0.1, -0.2],
-            [-0.1, 0, 0, 0, 0, 0, 0, -0.1],
-            [-0.1, 0, 0.05, 0.1, 0.1, 0.05, 0, -0.1],
-            [-0.1, 0.05, 0.05, 0.1, 0.1, 0.05, 0.05, -0.1],
-            [-0.1, 0, 0.1, 0.1, 0.1, 0.1, 0, -0.1],
-            [-0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, -0.1],
-            [-0.1, 0.05, 0, 0, 0, 0, 0.05, -0.1],
-            [-0.2, -0.1, -0.1, -0.1, -0.1, -0.1, -0.1, -0.2]
-        ]
-
-        rook_scores = [
-            [0, 0, 0, 0.05, 0.05, 0, 0, 0],
-            [0.05, 0, 0, 0, 0, 0, 0, 0.05],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ]
-
-        queen_scores = [
-            [-0.1, -0.05, -0.05, -0.025, -0.025, -0.05, -0.05, -0.1],
-            [-0.05, 0, 0, 0, 0, 0, 0, -0.05],
-            [-0.05, 0, 0.025, 0.025, 0.025, 0.025, 0, -0.05],
-            [-0.025, 0, 0.025, 0.025, 0.025, 0.025, 0, -0.025],
-            [0, 0, 0.025, 0.025, 0.025, 0.025, 0, 0],
-            [-0.05, 0.025, 0.025, 0.025, 0.025, 0.025, 0.025, -0.05],
-            [-0.05, 0, 0.025, 0, 0, 0, 0, -0.05],
-            [-0.1, -0.05, -0.05, -0.025, -0.025, -0.05, -0.05, -0.1]
-        ]
-
-        king_scores = [
-            [-0.3, -0.4, -0.4, -0.5, -0.5, -0.4, -0.4, -0.3],
-            [-0.3, -0.4, -0.4, -0.5, -0.5, -0.4, -0.4, -0.3],
-            [-0.3, -0.4, -0.4, -0.5, -0.5, -0.4, -0.4, -0.3],
-            [-0.3, -0.4, -0.4, -0.5, -0.5, -0.4, -0.4, -0.3],
-            [-0.2, -0.3, -0.3, -0.4, -0.4, -0.3, -0.3, -0.2],
-            [-0.1, -0.2, -0.2, -0.2, -0.2, -0.2, -0.2, -0.1],
-            [0.2, 0.2, 0, 0, 0, 0, 0.2, 0.2],
-            [0.2, 0.3, 0.1, 0, 0, 0.1, 0.3, 0.2]
-        ]
-
-        # Create a dictionary to map piece names to their respective scores
-        self.square_values = {
-            "Pawn": pawn_scores,
-            "Knight": knight_scores,
-            "Bishop": bishop_scores,
-            "Rook": rook_scores,
-            "Queen": queen_scores,
-            "King": king_scores
-        }
-
-    def evaluate_board(self) -> float:
-        score = sum(
-            (1 if piece.colour == "white" else -1) * (
-                    piece.value + self.square_values[piece.name][
-                piece.pos[0] if piece.colour == "white" else 7 - piece.pos[0]
-            ][piece.pos[1]]
-            )
-            for piece in self.engine.board.dict.values()
-        )
-
-        return round(score, 3)  # to eliminate the rounding error that sometimes occurred with the score
-
-    def negamax(self, depth: int, alpha: float, beta: float, turn_multiplier: int,
-                prev_best_move: tuple[BoardPosition, BoardPosition] | None = None) -> tuple[
-                float, tuple[BoardPosition, BoardPosition] | None]:
         if depth == 0:
-            return turn_multiplier * self.evaluate_board(), None
+            return self.quiescence(alpha, beta, turn_multiplier), None
+
+        self.nodes += 1
+        if self.stop_requested or (self.nodes & (LIMIT_CHECK_INTERVAL - 1) == 0 and self.out_of_budget()):
+            raise SearchAborted
 
-        moves = self.order_moves()
-        if prev_best_move:
-            moves = [prev_best_move] + moves  # search from the best move at the previous depth first
+        # Use the stored result if this position has already been searched deep enough. At the root a move is
+        # always searched so that the caller gets one back
+        original_alpha = alpha
+        entry = self.transposition_table.probe(self.engine.hash)
+        tt_move = None
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            tt_score = score_from_table(tt_score, ply)
+            if tt_depth >= depth and ply > 0:
+                if (tt_bound == EXACT or (tt_bound == LOWER_BOUND and tt_score >= beta) or
+                        (tt_bound == UPPER_BOUND and tt_score <= alpha)):
+                    return tt_score, tt_move
 
+        in_check = self.engine.in_check()
+        if (self.null_move and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check and
+                abs(beta) < KNOWN_WIN_SCORE):
+            score = self.null_move_search(depth, beta, turn_multiplier, ply)
+            if score is not None:
+                return score, None
+
+        moves = self.legal_moves()
         if len(moves) == 0:
-            if self.engine.in_check():
-                return float("-inf"), None
+            if in_check:
+                return -MATE_SCORE + ply, None  # prefer the quickest mate and the slowest defeat
             else:
                 return 0, None
 
-        max_score = float("-inf")
+        # Futility pruning: close to the horizon, if the static score is so far below alpha that a quiet move is
+        # unlikely to make it up, only captures, promotions and checks are searched. Not when alpha is a mate or
+        # bitbase score, which the static score can't be compared with
+        futility_score = None
+        if (self.futility_pruning and ply > 0 and depth < len(FUTILITY_MARGINS) and not in_check and
+                abs(alpha) < KNOWN_WIN_SCORE):
+            futility_score = turn_multiplier * self.evaluate_board() + FUTILITY_MARGINS[depth]
+            if futility_score > alpha:
+                futility_score = None
+
+        # The best move found by an earlier search of this position goes first. It is only used if it is in the
+        # legal moves, in case of a hash collision
+        squares = self.engine.board.squares
+        side = self.engine.side
+        moves = self.move_orderer.order(squares, moves, side, tt_move, ply)
+
+        max_score = -INFINITY
         best_move = random.choice(moves)  # a default move is chosen in case all moves evaluate to the same score, e.g. an
         # inevitable checkmate
-        for move in moves:
-            self.engine.make_move(move[0], move[1])
-            score, _ = self.negamax(depth - 1, -beta, -alpha, -turn_multiplier)
+        for index, move in enumerate(moves):
+            is_quiet = not move & TACTICAL
+            self.engine.push(move)
+            if is_quiet and futility_score is not None and not self.engine.in_check():
+                self.engine.undo_move()
+                max_score = max(max_score, futility_score)  # the move is assumed to score no more than this
+                continue
+
+            # Late move reductions: quiet moves ordered late are unlikely to be best, so they are searched less
+            # deeply with a null window first and only searched again in full if they turn out to beat alpha
+            reduction = 0
+            if (self.late_move_reductions and is_quiet and depth >= LMR_MIN_DEPTH and
+                    index >= LMR_FULL_DEPTH_MOVES and not in_check and not self.engine.in_check()):
+                reduction = 2 if index >= LMR_LATE_MOVES and depth >= 6 else 1
+            if reduction:
+                score, _ = self.negamax(depth - 1 - reduction, -alpha - 1, -alpha, -turn_multiplier, ply + 1)
+                if -score > alpha:
+                    score, _ = self.negamax(depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
+            else:
+                score, _ = self.negamax(depth - 1, -beta, -alpha, -turn_multiplier, ply + 1)
             score *= -1  # Negate the score since it's from the opponent's perspective
             self.engine.undo_move()
 
@@ -127,39 +161,257 @@ class AI:
 
             alpha = max(alpha, score)
             if alpha >= beta:
+                if self.stats is not None:
+                    self.stats.record_cutoff(index == 0)
+                if is_quiet:
+                    self.move_orderer.record_cutoff(move, side, depth, ply)
                 break  # Beta cutoff
 
+        if max_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif max_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transposition_table.store(self.engine.hash, depth, score_to_table(max_score, ply), bound, best_move)
+
         return max_score, best_move
 
-    def get_best_move(self) -> tuple[BoardPosition, BoardPosition]:
-        # Call negamax to find the best move
+    def null_move_search(self, depth: int, beta: int, turn_multiplier: int, ply: int) -> int | None:
+        """Null-move pruning: lets the opponent move twice in a row with a shallower search. If the position is
+        still at least beta, a real move would almost certainly be too, so the node is cut off and its score (a lower
+        bound) returned. Returns None if the node has to be searched.
+
+        Passing is only tried when the static score is already at least beta, never twice in a row and never when
+        the side to move has only pawns left, since in those endings zugzwang (where every move makes things worse)
+        is common and would make the null move look better than any real move
+        """
+        engine = self.engine
+        if (engine.move_log[-1] == NO_MOVE or turn_multiplier * self.evaluate_board() < beta or
+                not engine.has_non_pawn_material(engine.side)):
+            return None
+
+        reduction = NULL_MOVE_REDUCTION + 1 if depth >= 6 else NULL_MOVE_REDUCTION
+        engine.push_null()
+        score, _ = self.negamax(max(depth - 1 - reduction, 0), -beta, -beta + 1, -turn_multiplier, ply + 1)
+        score *= -1
+        engine.undo_move()
+        if score >= beta:
+            return beta if score > MATE_THRESHOLD else score  # a mate found after passing can't be trusted
+        return None
+
+    def probe_bitbases(self, depth: int, ply: int) -> int | None:
+        """The score of a position whose result is known from the bitbases, or None to search it as usual.
+
+        Draws are always taken from the bitbases. Wins score by how close they are to mate so that the search makes
+        progress, but if the search started from a bitbase position they are only scored that way at the horizon,
+        since otherwise every move would look the same and the search would never find the mate
+        """
+        result = self.bitbases.probe(self.engine)
+        if result is None:
+            return None
+        if result == DRAW:
+            return 0
+        if depth > 0 and self.root_piece_count <= 3:
+            return None
+        if result == LOSS and len(self.legal_moves()) == 0:
+            return -MATE_SCORE + ply  # the bitbases don't tell a mate from any other lost position
+        score = KNOWN_WIN_SCORE + self.bitbases.progress(self.engine)
+        return score if result == WIN else -score
+
+    def quiescence(self, alpha: int, beta: int, turn_multiplier: int, depth: int = 0) -> int:
+        """Searches only captures (and promotions) beyond the horizon until the position is quiet, so a leaf isn't
+        scored in the middle of an exchange. The side to move may 'stand pat' and take the static score instead of
+        capturing, since it usually has a quiet move at least that good
+        """
+        self.nodes += 1
+        self.quiescence_nodes += 1
+        if self.stop_requested or (self.nodes & (LIMIT_CHECK_INTERVAL - 1) == 0 and self.out_of_budget()):
+            raise SearchAborted
+
+        stand_pat = turn_multiplier * self.evaluate_board()
+        if stand_pat >= beta or depth >= self.quiescence_depth:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        squares = self.engine.board.squares
+        moves = self.move_orderer.order_captures(squares, self.legal_moves(captures_only=True))
+
+        max_score = stand_pat
+        for move in moves:
+            # Delta pruning: skip captures that can't bring the score up to alpha even with a margin to spare
+            gain = MATERIAL_VALUES[move >> CAPTURE_SHIFT & TYPE_MASK]
+            if move & PROMOTION:
+                gain += MATERIAL_VALUES[QUEEN] - MATERIAL_VALUES[PAWN]
+            if stand_pat + gain + DELTA_MARGIN <= alpha:
+                continue
+
+            self.engine.push(move)
+            score = -self.quiescence(-beta, -alpha, -turn_multiplier, depth + 1)
+            self.engine.undo_move()
+
+            if score > max_score:
+                max_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return max_score
+
+    def out_of_budget(self) -> bool:
+        return ((self.deadline is not None and time.perf_counter() >= self.deadline) or
+                (self.max_nodes is not None and self.nodes >= self.max_nodes) or
+                (self.stop_event is not None and self.stop_event.is_set()))
+
+    def get_best_move(self, depth: int | None = None, time_limit: float | None = None, node_limit: int | None = None,
+                      with_stats: bool = False) -> int | None | tuple[int | None, SearchStats]:
+        """Searches for the best move for the side to move, returned as a packed move (see moves.py).
+
+        The depth, time limit (in seconds) and node limit default to the AI's own settings. A search that runs out
+        of time or nodes, or is stopped, returns the best move of the last completed depth (None if there isn't
+        one), so a time limit should leave room for at least the first iteration. Positions in the AI's opening book
+        are answered with a book move without searching.
+
+        With 'with_stats' the move is returned along with a SearchStats of the search
+        """
+        if not with_stats:
+            return self.iterative_deepening(depth, time_limit, node_limit)
+
+        self.stats = SearchStats()
+        self.instrument(self.stats)
+        start_time = time.perf_counter()
+        try:
+            move = self.iterative_deepening(depth, time_limit, node_limit)
+        finally:
+            self.remove_instrumentation()
+            stats, self.stats = self.stats, None
+        stats.time = time.perf_counter() - start_time
+        stats.nodes = self.nodes
+        stats.quiescence_nodes = self.quiescence_nodes
+        return move, stats
+
+    def iterative_deepening(self, depth: int | None, time_limit: float | None,
+                            node_limit: int | None) -> int | None:
+        max_depth = self.depth if depth is None else depth
+        time_limit = self.time_limit if time_limit is None else time_limit
+        self.max_nodes = self.node_limit if node_limit is None else node_limit
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.completed_depth = 0
+        if self.book is not None:
+            move = self.book.choose(self.engine)
+            if move is not None:
+                if self.stats is not None:
+                    self.stats.book_move = True
+                return move
+
+        self.transposition_table.new_search()
+        self.move_orderer.new_search()
+
+        # Call negamax to find the best move. Each iteration searches the previous iteration's best move first
+        # since it is stored in the transposition table
         turn_multiplier = 1 if self.engine.turn == "white" else -1
+        self.root_ply = len(self.engine.move_log)
+        self.root_piece_count = self.engine.piece_count
         best_move = None
-        for depth in range(1, self.depth + 1):
-            score, best_move = self.negamax(depth, float('-inf'), float('inf'), turn_multiplier, best_move)
+        depth = 0
+        iteration_start = (start_time, 0, 0)  # time and node counts when the current iteration started
+        try:
+            for depth in range(1, max_depth + 1):
+                iteration_start = (time.perf_counter(), self.nodes, self.quiescence_nodes)
+                score, move = self.aspiration_search(depth, turn_multiplier)
+                best_move, self.best_score, self.completed_depth = move, score, depth
+                if self.stats is not None:
+                    self.record_iteration(depth, iteration_start, True, score, move)
+                if self.on_iteration is not None:
+                    self.on_iteration(depth, score, move)
+                if abs(score) > MATE_THRESHOLD:
+                    break  # a forced mate has been found, searching deeper won't find a shorter one
+                # The next iteration takes a few times longer than this one, so don't start it if it can't finish.
+                # The deadline may have been moved since the search started, e.g. by a pondering search going live
+                if self.deadline is not None and time.perf_counter() > (start_time + self.deadline) / 2:
+                    break
+        except SearchAborted:
+            if self.stats is not None:
+                self.record_iteration(depth, iteration_start, False)
+            # The engine is left part-way through the search so take back the moves that were made
+            while len(self.engine.move_log) > self.root_ply:
+                self.engine.undo_move()
         return best_move
 
-    def order_moves(self) -> list[tuple[BoardPosition, BoardPosition]]:
-        """Orders the legal moves in a way that will potentially speed up the negamax search"""
-        ordered_moves = []
+    def record_iteration(self, depth: int, iteration_start: tuple[float, int, int], completed: bool,
+                         score: int | None = None, move: int | None = None):
+        start_time, nodes, quiescence_nodes = iteration_start
+        self.stats.record_iteration(depth, self.nodes - nodes, self.quiescence_nodes - quiescence_nodes,
+                                    time.perf_counter() - start_time, completed, score,
+                                    move_name(move) if move is not None else None)
+
+    def legal_moves(self, captures_only: bool = False) -> list[int]:
+        """The engine's legal moves, timed as move generation when collecting stats. The engine itself is never
+        wrapped since the search hands copies of it to other processes
+        """
+        if self.stats is None:
+            return self.engine.get_legal_moves(captures_only)
+        start_time = time.perf_counter()
+        moves = self.engine.get_legal_moves(captures_only)
+        self.stats.record_phase("move_generation", time.perf_counter() - start_time)
+        return moves
+
+    def instrument(self, stats: SearchStats):
+        """Times the phases of the search by wrapping the methods involved, for this AI only. Move generation is
+        timed by 'legal_moves'
+        """
+        self.move_orderer.order = stats.timed("move_ordering", self.move_orderer.order)
+        self.move_orderer.order_captures = stats.timed("capture_ordering", self.move_orderer.order_captures)
+        self.evaluate_board = stats.timed("evaluation", self.evaluate_board)
+
+    def remove_instrumentation(self):
+        # The wrappers are instance attributes hiding the methods of the class
+        del self.move_orderer.order
+        del self.move_orderer.order_captures
+        del self.evaluate_board
+
+    def aspiration_search(self, depth: int, turn_multiplier: int) -> tuple[int, int | None]:
+        """Searches the root with a narrow window around the previous iteration's score, which cuts off more of the
+        tree. If the score falls outside the window it is widened on that side and the search repeated
+        """
+        if depth <= 2 or abs(self.best_score) > MATE_THRESHOLD:
+            return self.negamax(depth, -INFINITY, INFINITY, turn_multiplier)
+
+        delta = ASPIRATION_WINDOW
+        alpha = self.best_score - delta
+        beta = self.best_score + delta
+        while True:
+            score, move = self.negamax(depth, alpha, beta, turn_multiplier)
+            if score <= alpha:
+                alpha = max(score - delta, -INFINITY)
+            elif score >= beta:
+                beta = min(score + delta, INFINITY)
+            else:
+                return score, move
+            delta *= 2
+
 
-        moves = self.engine.get_legal_moves()
-        # Prioritise pawn promotions
-        promotion_moves = [move for move in moves if self.engine.board.dict[move[0]].name == "Pawn" and
-                           (move[1][0] == 0 or move[1][0] == 7)]
-        ordered_moves.extend(promotion_moves)
+class SearchAborted(Exception):
+    """Raised inside negamax to unwind the search when it has been asked to stop"""
 
-        # Prioritise capture moves and sort by value of piece captured
-        capture_moves = [move for move in moves if self.engine.board.dict.get(move[1]) is not None]
-        capture_moves.sort(key=lambda move: self.engine.board.dict[move[1]].value, reverse=True)
-        ordered_moves.extend(capture_moves)
 
-        # Prioritise moves that control central squares
-        central_moves = [move for move in moves if move[1] in [(3, 3), (3, 4), (4, 3), (4, 4)]]
-        ordered_moves.extend(central_moves)
+def score_to_table(score: int, ply: int) -> int:
+    """Mate scores are stored as the distance to mate from the stored position rather than from the root, so they
+    stay correct when the position is reached at a different ply
+    """
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
 
-        # Add in the rest of the moves
-        remaining_moves = [move for move in moves if move not in ordered_moves]
-        ordered_moves.extend(remaining_moves)
 
-        return ordered_moves
+def score_from_table(score: int, ply: int) -> int:
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
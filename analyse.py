@@ -0,0 +1,133 @@
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import parallel
+from collections.abc import Iterator
+from ai import AI, MATE_SCORE, MATE_THRESHOLD
+from engine import Engine
+from moves import move_name
+from pgn import read_games, parse_san, san
+
+DEFAULT_DEPTH = 3
+BLUNDER_THRESHOLD = 200  # centipawns a move has to lose against the best move to be flagged as a blunder
+SCORE_CAP = 1000  # scores are capped at this for working out losses, so missing a mate in 3 for a mate in 5 isn't
+# counted as thousands of centipawns lost
+
+
+def analyse_game(index: int, headers: dict[str, str], moves: list[str], blunder_threshold: int) -> dict:
+    """Runs in a worker process: searches every position of a game and returns its record. Each move gets the
+    evaluation of the position after it (from white's point of view), the engine's best move in its place, how many
+    centipawns it lost against that move and whether that makes it a blunder. A game is only analysed up to the
+    first move that can't be read, e.g. an en passant capture, which is given as the record's 'error'
+    """
+    ai = parallel.worker_ai
+    try:
+        engine = Engine.from_fen(headers["FEN"]) if "FEN" in headers else Engine()
+    except ValueError as error:
+        return {"game": index, "headers": headers, "moves": [], "error": str(error)}
+    ai.engine = engine
+
+    record = {"game": index, "headers": headers, "moves": []}
+    score, best_move = search_position(ai)
+    for text in moves:
+        try:
+            move = parse_san(engine, text)
+        except ValueError as error:
+            record["error"] = str(error)
+            break
+        best = san(engine, best_move) if best_move is not None else None
+        white_to_move = engine.turn == "white"
+        engine.push(move)
+        reply_score, reply_move = search_position(ai)
+
+        # Both scores are from the point of view of the side to move, so the played move is worth -reply_score
+        loss = white_score = None
+        if reply_score is not None:
+            white_score = -reply_score if white_to_move else reply_score
+            if score is not None:
+                loss = 0 if move == best_move else max(0, cap(score) + cap(reply_score))
+        record["moves"].append({"ply": len(record["moves"]) + 1, "move": text, "uci": move_name(move), "best": best,
+                                **describe_score(white_score), "loss": loss,
+                                "blunder": loss is not None and loss >= blunder_threshold})
+        score, best_move = reply_score, reply_move
+    return record
+
+
+def search_position(ai: AI) -> tuple[int | None, int | None]:
+    """The score of the position for the side to move and the best move (None in checkmate or stalemate). The score
+    is None if the search ran out of time or nodes before finishing its first iteration
+    """
+    move = ai.get_best_move()
+    if ai.completed_depth == 0:
+        return None, None
+    return ai.best_score, move
+
+
+def cap(score: int) -> int:
+    return max(-SCORE_CAP, min(SCORE_CAP, score))
+
+
+def describe_score(score: int | None) -> dict:
+    """A score from white's point of view as centipawns, or as moves to mate (negative when black mates)"""
+    if score is not None and abs(score) > MATE_THRESHOLD:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return {"eval": None, "mate": moves if score > 0 else -moves}
+    return {"eval": score, "mate": None}
+
+
+def analyse_games(games: Iterator[tuple[dict[str, str], list[str]]], config: dict, workers: int,
+                  blunder_threshold: int = BLUNDER_THRESHOLD) -> Iterator[dict]:
+    """Analyses games in a pool of worker processes and yields their records in the order of the input. Only a
+    few games per worker are read ahead, so memory use doesn't grow with the size of the input however slowly the
+    records are consumed
+    """
+    window = collections.deque()
+    config = {"depth": DEFAULT_DEPTH, **config}
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=parallel.init_worker_ai,
+                                                initargs=(config,)) as executor:
+        for index, (headers, moves) in enumerate(games):
+            window.append(executor.submit(analyse_game, index, headers, moves, blunder_threshold))
+            # The window is drained from the front, so a slow game holds back the records after it but only until
+            # the window is full
+            if len(window) >= workers * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate every move of the games in a PGN file and flag blunders, "
+                                                 "writing a JSON line per game")
+    parser.add_argument("pgn")
+    parser.add_argument("-o", "--output", help="file to write to (default: standard output)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="search depth per position")
+    parser.add_argument("--nodes", type=int, help="node limit per position")
+    parser.add_argument("--movetime", type=float, help="time limit per position in seconds")
+    parser.add_argument("--hash", type=float, default=16, help="transposition table size per worker in MB")
+    parser.add_argument("--blunder", type=int, default=BLUNDER_THRESHOLD,
+                        help="centipawns lost that make a move a blunder")
+    parser.add_argument("--max-games", type=int, help="stop after this many games")
+    args = parser.parse_args()
+
+    config = {"depth": args.depth, "node_limit": args.nodes, "time_limit": args.movetime, "hash_size_mb": args.hash}
+    output = open(args.output, "w") if args.output else sys.stdout
+    with open(args.pgn, encoding="utf-8", errors="replace") as file:
+        games = itertools.islice(read_games(file), args.max_games)
+        count = 0
+        for record in analyse_games(games, config, args.workers, args.blunder):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            count += 1
+    print(f"analysed {count} games", file=sys.stderr)
+
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
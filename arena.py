@@ -0,0 +1,247 @@
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import random
+import sys
+import time
+from ai import AI
+from book import OpeningBook
+from engine import Engine, move_name, CHECKMATE, STALEMATE
+from pieces import EMPTY, KING, KNIGHT, BISHOP, TYPE_MASK
+from settings import SQUARES
+
+# Games that reach this many plies are scored as draws
+DEFAULT_MAX_PLIES = 300
+
+
+def parse_config(text: str) -> dict:
+    """Reads AI keyword arguments written as 'depth=3,time_limit=0.5,quiescence_depth=4'. A 'book' is given as
+    the path of the book file
+    """
+    config = {}
+    for item in filter(None, text.split(",")):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        value = value.strip()
+        if value.lower() in ("true", "false"):
+            config[name] = value.lower() == "true"
+        elif value.lower() == "none":
+            config[name] = None
+        else:
+            try:
+                config[name] = int(value)
+            except ValueError:
+                try:
+                    config[name] = float(value)
+                except ValueError:
+                    config[name] = value
+    config.setdefault("depth", 3)
+    return config
+
+
+def random_opening(seed: int, plies: int) -> str:
+    """A FEN reached by playing random legal moves from the start, so that deterministic engines play different
+    games. The same seed always gives the same opening
+    """
+    rng = random.Random(seed)
+    engine = Engine()
+    for _ in range(plies):
+        moves = engine.get_legal_moves()
+        if len(moves) == 0:
+            break
+        engine.push(rng.choice(moves))
+    if engine.game_state() in (CHECKMATE, STALEMATE):
+        return random_opening(seed + 1_000_003, plies)
+    return engine.to_fen()
+
+
+def insufficient_material(engine: Engine) -> bool:
+    """Only the kings are left, or the kings and a single knight or bishop"""
+    minor_pieces = 0
+    for square in SQUARES:
+        piece_type = engine.board.squares[square] & TYPE_MASK
+        if piece_type == EMPTY or piece_type == KING:
+            continue
+        if piece_type != KNIGHT and piece_type != BISHOP:
+            return False
+        minor_pieces += 1
+    return minor_pieces <= 1
+
+
+def play_game(index: int, fen: str, white: dict, black: dict, max_plies: int) -> dict:
+    """Plays one game between two AI configurations and returns its record. The result is '1-0', '0-1' or
+    '1/2-1/2' and the reason one of 'checkmate', 'stalemate', 'repetition', 'fifty-move', 'material' or 'max-plies'
+    """
+    engine = Engine.from_fen(fen)
+    players = {}
+    for colour, config in (("white", white), ("black", black)):
+        config = dict(config)
+        if config.get("book") is not None:
+            config["book"] = OpeningBook(config["book"])
+        players[colour] = AI(colour, config.pop("depth"), engine, **config)
+
+    # Positions since the last capture or pawn move, the only ones that can repeat
+    repetitions = {engine.hash: 1}
+    moves = []
+    result, reason = "1/2-1/2", "max-plies"
+    while True:
+        state = engine.game_state()
+        if state == CHECKMATE:
+            result, reason = ("0-1" if engine.turn == "white" else "1-0"), "checkmate"
+            break
+        if state == STALEMATE:
+            reason = "stalemate"
+            break
+        if repetitions[engine.hash] >= 3:
+            reason = "repetition"
+            break
+        if engine.halfmove_clock >= 100:
+            reason = "fifty-move"
+            break
+        if insufficient_material(engine):
+            reason = "material"
+            break
+        if len(moves) >= max_plies:
+            break
+
+        ai = players[engine.turn]
+        start_time = time.perf_counter()
+        move = ai.get_best_move()
+        elapsed = time.perf_counter() - start_time
+        if move is None:  # the time or node limit ran out before the first iteration finished
+            move = engine.get_legal_moves()[0]
+        moves.append({"move": move_name(move), "nodes": ai.nodes, "depth": ai.completed_depth,
+                      "time": round(elapsed, 4)})
+        engine.push(move)
+        if engine.halfmove_clock == 0:
+            repetitions.clear()
+        repetitions[engine.hash] = repetitions.get(engine.hash, 0) + 1
+
+    return {"game": index, "fen": fen, "white": white, "black": black, "result": result, "reason": reason,
+            "plies": len(moves), "moves": moves}
+
+
+def elo_difference(score: float) -> float:
+    """Elo difference implied by a score fraction"""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def expected_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class Summary:
+    """Running totals from the first configuration's point of view, with the Elo difference, its 95% error
+    margin and a sequential probability ratio test of elo0 against elo1
+    """
+
+    def __init__(self, elo0: float = 0, elo1: float = 5, alpha: float = 0.05, beta: float = 0.05):
+        self.wins = self.draws = self.losses = 0
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self.upper_bound = math.log((1 - beta) / alpha)
+
+    def add(self, record: dict, first_is_white: bool):
+        if record["result"] == "1/2-1/2":
+            self.draws += 1
+        elif (record["result"] == "1-0") == first_is_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    @property
+    def games(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    def score(self) -> float:
+        return (self.wins + self.draws / 2) / self.games
+
+    def variance(self) -> float:
+        """Variance of a single game's score"""
+        score = self.score()
+        return ((self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) /
+                self.games)
+
+    def elo(self) -> tuple[float, float]:
+        score = self.score()
+        margin = 1.96 * math.sqrt(self.variance() / self.games)
+        return elo_difference(score), (elo_difference(min(score + margin, 1)) -
+                                       elo_difference(max(score - margin, 0))) / 2
+
+    def llr(self) -> float:
+        """Log-likelihood ratio of elo1 against elo0, using the normal approximation to the score distribution"""
+        variance = self.variance()
+        if variance == 0:
+            return 0.0
+        score0, score1 = expected_score(self.elo0), expected_score(self.elo1)
+        return self.games * (score1 - score0) * (2 * self.score() - score0 - score1) / (2 * variance)
+
+    def __str__(self) -> str:
+        elo, margin = self.elo()
+        llr = self.llr()
+        if llr >= self.upper_bound:
+            verdict = f"H1 accepted (elo >= {self.elo1:g})"
+        elif llr <= self.lower_bound:
+            verdict = f"H0 accepted (elo <= {self.elo0:g})"
+        else:
+            verdict = "inconclusive"
+        return (f"{self.games} games: +{self.wins} ={self.draws} -{self.losses}, score {self.score():.3f}, "
+                f"elo {elo:+.1f} +/- {margin:.1f}, LLR {llr:.2f} [{self.lower_bound:.2f}, {self.upper_bound:.2f}] "
+                f"{verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between two AI configurations without the GUI and "
+                                                 "report how much stronger the first one is")
+    parser.add_argument("first", type=parse_config, help="AI keyword arguments, e.g. 'depth=3,quiescence_depth=4'")
+    parser.add_argument("second", type=parse_config)
+    parser.add_argument("-n", "--games", type=int, default=100, help="rounded up to an even number so every "
+                                                                     "opening is played with both colours")
+    parser.add_argument("-o", "--output", help="file to write a JSON line per game to (default: standard output)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--openings", help="file of FEN positions, one per line, to start games from")
+    parser.add_argument("--random-plies", type=int, default=4,
+                        help="random moves played from the start to make each opening when no file is given")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--elo0", type=float, default=0)
+    parser.add_argument("--elo1", type=float, default=5)
+    args = parser.parse_args()
+
+    pairs = (args.games + 1) // 2
+    if args.openings:
+        with open(args.openings) as file:
+            openings = [line.strip() for line in file if line.strip()]
+        openings = [openings[pair % len(openings)] for pair in range(pairs)]
+    else:
+        openings = [random_opening(args.seed + pair, args.random_plies) for pair in range(pairs)]
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    summary = Summary(args.elo0, args.elo1)
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+        futures = {}
+        for index in range(pairs * 2):
+            # Each opening is played twice, with the first configuration taking white then black
+            first_is_white = index % 2 == 0
+            white, black = (args.first, args.second) if first_is_white else (args.second, args.first)
+            future = executor.submit(play_game, index, openings[index // 2], white, black, args.max_plies)
+            futures[future] = first_is_white
+
+        # Results are written as the games finish, so they aren't in game order
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            summary.add(record, futures[future])
+            print(summary, file=sys.stderr)
+
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import functools
+import os
+import time
+from array import array
+from collections import deque
+from pieces import *
+from evaluation import MATERIAL_VALUES
+
+# Bitbases hold one bit per position of a king and piece against a bare king: whether the side with the piece (the
+# strong side) wins. They are generated for white as the strong side, and positions with black as the strong side
+# are looked up with the board flipped. A position is indexed by the side to move, the strong king, weak king and
+# piece squares, each numbered 0-63 as row * 8 + col. Illegal positions are stored as draws
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+FILE_NAMES = {PAWN: "kpk.bin", ROOK: "krk.bin", QUEEN: "kqk.bin"}
+POSITIONS = 2 * 64 * 64 * 64
+STRONG_TO_MOVE = 0
+WEAK_TO_MOVE = 1
+
+# Probe results, from the point of view of the side to move
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+PIECE_RAYS = {ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+
+
+def position_index(side_to_move: int, strong_king: int, weak_king: int, piece: int) -> int:
+    """Index of a position given 0x88 squares, with white as the strong side"""
+    return (((side_to_move << 6 | to_64(strong_king)) << 6 | to_64(weak_king)) << 6) | to_64(piece)
+
+
+def to_64(square: int) -> int:
+    return (square >> 4) << 3 | (square & 7)
+
+
+def to_0x88(square: int) -> int:
+    return (square >> 3) << 4 | (square & 7)
+
+
+def adjacent(square1: int, square2: int) -> bool:
+    """Whether two squares are the same or next to each other, i.e. where kings can't stand"""
+    return abs((square1 >> 4) - (square2 >> 4)) <= 1 and abs((square1 & 7) - (square2 & 7)) <= 1
+
+
+def attacks(piece_type: int, square: int, target: int, blocker: int) -> bool:
+    """Whether a white piece attacks the target square, with its lines only blocked by the blocker square"""
+    if piece_type == PAWN:
+        return target in PAWN_ATTACKS[WHITE >> 3][square]
+    for ray in PIECE_RAYS[piece_type][square]:
+        for pos in ray:
+            if pos == blocker:
+                break
+            if pos == target:
+                return True
+    return False
+
+
+def is_legal(piece_type: int, side_to_move: int, strong_king: int, weak_king: int, piece: int) -> bool:
+    if strong_king == piece or weak_king == piece or adjacent(strong_king, weak_king):
+        return False
+    if piece_type == PAWN and (piece < 16 or piece >= 112):
+        return False
+    # The weak king can't be left in check with the strong side to move
+    return side_to_move == WEAK_TO_MOVE or not attacks(piece_type, piece, weak_king, strong_king)
+
+
+def weak_moves(piece_type: int, strong_king: int, weak_king: int, piece: int) -> tuple[int, bool]:
+    """The number of legal moves of the weak king and whether it is in check"""
+    count = 0
+    for target in KING_TARGETS[weak_king]:
+        # Capturing the piece is fine as long as the strong king doesn't defend it, i.e. isn't next to it
+        if not adjacent(target, strong_king) and (target == piece or not attacks(piece_type, piece, target,
+                                                                                 strong_king)):
+            count += 1
+    return count, attacks(piece_type, piece, weak_king, strong_king)
+
+
+def strong_unmoves(piece_type: int, strong_king: int, weak_king: int, piece: int):
+    """Positions with the strong side to move from which a strong move leads to the given position, as
+    (strong king, piece) pairs. The weak king doesn't move
+    """
+    for square in KING_TARGETS[strong_king]:
+        if square != piece and not adjacent(square, weak_king):
+            yield square, piece
+    if piece_type == PAWN:
+        square = piece + 16
+        if square < 112 and square != strong_king and square != weak_king:
+            yield strong_king, square
+            # Pawns on row 4 could have come from their start row in one move
+            if piece >> 4 == 4 and square + 16 != strong_king and square + 16 != weak_king:
+                yield strong_king, square + 16
+    else:
+        for ray in PIECE_RAYS[piece_type][piece]:
+            for square in ray:
+                if square == strong_king or square == weak_king:
+                    break
+                yield strong_king, square
+
+
+def generate(piece_type: int, queen_table: bytes | None = None) -> bytearray:
+    """Solves a bitbase by retrograde analysis: starting from the checkmates (and for pawns the winning
+    promotions, looked up in the queen's bitbase), wins are propagated backwards to positions where the strong side
+    has a move to a win or the weak side only has moves to wins
+    """
+    wins = bytearray(POSITIONS)
+    moves_left = array("b", bytes(POSITIONS))  # weak moves that haven't been shown to lose yet
+    queue = deque()
+    for strong_king in SQUARES:
+        for weak_king in SQUARES:
+            if adjacent(strong_king, weak_king):
+                continue
+            for piece in SQUARES:
+                if is_legal(piece_type, WEAK_TO_MOVE, strong_king, weak_king, piece):
+                    count, in_check = weak_moves(piece_type, strong_king, weak_king, piece)
+                    index = position_index(WEAK_TO_MOVE, strong_king, weak_king, piece)
+                    moves_left[index] = count
+                    if count == 0 and in_check:
+                        wins[index] = 1
+                        queue.append(index)
+
+                # Promoting a pawn wins if the queen it becomes wins
+                if (piece_type == PAWN and piece >> 4 == 1 and
+                        is_legal(PAWN, STRONG_TO_MOVE, strong_king, weak_king, piece)):
+                    promotion = piece - 16
+                    if (promotion != strong_king and promotion != weak_king and
+                            queen_table[position_index(WEAK_TO_MOVE, strong_king, weak_king, promotion)]):
+                        index = position_index(STRONG_TO_MOVE, strong_king, weak_king, piece)
+                        wins[index] = 1
+                        queue.append(index)
+
+    while queue:
+        index = queue.popleft()
+        side_to_move = index >> 18
+        strong_king = to_0x88(index >> 12 & 63)
+        weak_king = to_0x88(index >> 6 & 63)
+        piece = to_0x88(index & 63)
+        if side_to_move == WEAK_TO_MOVE:
+            # Any strong move into this position wins
+            for previous_king, previous_piece in strong_unmoves(piece_type, strong_king, weak_king, piece):
+                if is_legal(piece_type, STRONG_TO_MOVE, previous_king, weak_king, previous_piece):
+                    previous = position_index(STRONG_TO_MOVE, previous_king, weak_king, previous_piece)
+                    if not wins[previous]:
+                        wins[previous] = 1
+                        queue.append(previous)
+        else:
+            # The weak side loses once every one of its moves leads to a win
+            for previous_king in KING_TARGETS[weak_king]:
+                if previous_king != piece and not adjacent(previous_king, strong_king):
+                    previous = position_index(WEAK_TO_MOVE, strong_king, previous_king, piece)
+                    if not wins[previous] and moves_left[previous] > 0:
+                        moves_left[previous] -= 1
+                        if moves_left[previous] == 0:
+                            wins[previous] = 1
+                            queue.append(previous)
+
+    # Pack eight positions into each byte, the lowest bit first
+    packed = bytearray(POSITIONS // 8)
+    for index in range(POSITIONS):
+        if wins[index]:
+            packed[index >> 3] |= 1 << (index & 7)
+    return packed
+
+
+def unpack(packed: bytes) -> bytes:
+    return bytes(packed[index >> 3] >> (index & 7) & 1 for index in range(len(packed) * 8))
+
+
+class Bitbases:
+    """Exact win/draw results of king and pawn, rook or queen against a bare king, read from the files made by
+    'python bitbase.py'. Kings alone or with a single minor piece are always draws. Positions whose material isn't
+    covered return None
+    """
+
+    def __init__(self, directory: str = DIRECTORY):
+        self.tables: dict[int, bytes] = {}
+        for piece_type, file_name in FILE_NAMES.items():
+            path = os.path.join(directory, file_name)
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    self.tables[piece_type] = file.read()
+
+    def probe(self, engine) -> int | None:
+        """WIN, DRAW or LOSS for the side to move, or None if the position has more material than the bitbases
+        cover. Only looks at the board when the engine's piece count is three or fewer
+        """
+        if engine.piece_count > 3:
+            return None
+        squares = engine.board.squares
+        piece = EMPTY
+        square = -1
+        for pos in SQUARES:
+            code = squares[pos]
+            if code != EMPTY and code & TYPE_MASK != KING:
+                piece, square = code, pos
+                break
+        piece_type = piece & TYPE_MASK
+        if piece_type == EMPTY or piece_type == KNIGHT or piece_type == BISHOP:
+            return DRAW  # no checkmate is possible
+        if piece_type not in self.tables:
+            return None
+
+        strong = piece & BLACK
+        strong_king = engine.king_squares[strong]
+        weak_king = engine.king_squares[strong ^ BLACK]
+        if strong == BLACK:
+            # Flip the board so that the strong side is white moving up it
+            strong_king, weak_king, square = strong_king ^ 0x70, weak_king ^ 0x70, square ^ 0x70
+        side_to_move = STRONG_TO_MOVE if engine.side == strong else WEAK_TO_MOVE
+        index = position_index(side_to_move, strong_king, weak_king, square)
+        if not self.tables[piece_type][index >> 3] >> (index & 7) & 1:
+            return DRAW
+        return WIN if side_to_move == STRONG_TO_MOVE else LOSS
+
+    def progress(self, engine) -> int:
+        """How far a won position has been brought towards mate, for the strong side: its material (so a pawn
+        promotes), the weak king near an edge, the kings close together and a pawn close to promoting. Lets the
+        search make progress between positions that are all wins
+        """
+        squares = engine.board.squares
+        strong = next(squares[pos] & BLACK for pos in SQUARES
+                      if squares[pos] != EMPTY and squares[pos] & TYPE_MASK != KING)
+        strong_king = engine.king_squares[strong]
+        weak_king = engine.king_squares[strong ^ BLACK]
+        row, col = weak_king >> 4, weak_king & 7
+        edge_distance = min(row, 7 - row) + min(col, 7 - col)
+        king_distance = abs((strong_king >> 4) - row) + abs((strong_king & 7) - col)
+        score = 10 * (6 - edge_distance) + 4 * (14 - king_distance)
+        for pos in SQUARES:
+            piece = squares[pos]
+            if piece != EMPTY and piece & BLACK == strong:
+                score += MATERIAL_VALUES[piece & TYPE_MASK]
+                if piece & TYPE_MASK == PAWN:
+                    score += 20 * (7 - (pos >> 4) if strong == WHITE else pos >> 4)
+        return score
+
+
+@functools.cache
+def default_bitbases() -> Bitbases:
+    """The bitbases in the package's 'bitbases' directory, loaded once per process"""
+    return Bitbases()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the king and pawn, rook and queen against king bitbases")
+    parser.add_argument("-o", "--output", default=DIRECTORY, help="directory to write the bitbases to")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    tables = {}
+    for piece_type in (QUEEN, ROOK, PAWN):  # pawns promote, so the queen's bitbase is needed first
+        start_time = time.perf_counter()
+        tables[piece_type] = generate(piece_type, unpack(tables[QUEEN]) if piece_type == PAWN else None)
+        path = os.path.join(args.output, FILE_NAMES[piece_type])
+        with open(path, "wb") as file:
+            file.write(tables[piece_type])
+        wins = sum(bin(byte).count("1") for byte in tables[piece_type])
+        print(f"{path}: {wins} wins, {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
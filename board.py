@@ -1,52 +1,57 @@
-from settings import BOARD_DIM, SQUARE_DIM
+from collections.abc import Iterator, Mapping
+from settings import *
 from pieces import *
 
 
 class Board:
-    def __init__(self):
-        self.dict = {}  # dictionary where the keys are board positions and the values are piece objects
-        for piece in self.create_pieces():
-            self.dict[piece.pos] = piece
-
-        self.colours = ["beige", "bisque4"]
-
-    def create_pieces(self) -> list[Piece]:
-        pieces = []
-        # Place pawns
+    def __init__(self, squares: list[int] | None = None):
+        # 0x88 array of piece codes, the off-board half is never written to. Without one the board is set up for
+        # the start of a game
+        self.squares = [EMPTY] * 128 if squares is None else squares
+        self.dict = BoardView(self)  # dict-like view of the pieces keyed by board position, used by the GUI
+        if squares is None:
+            self.create_pieces()
+
+    def copy(self) -> "Board":
+        board = Board.__new__(Board)
+        board.squares = self.squares[:]
+        board.dict = BoardView(board)
+        return board
+
+    def create_pieces(self):
+        back_rank = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
         for col in range(BOARD_DIM):
-            pieces.append(Pawn("white", BoardPosition(6, col), self))  # white pawns are on row 6
-            pieces.append(Pawn("black", BoardPosition(1, col), self))  # black pawns are on row 1
-
-        # Place Rooks
-        pieces.append(Rook("white", BoardPosition(7, 0), self))
-        pieces.append(Rook("white", BoardPosition(7, 7), self))
-        pieces.append(Rook("black", BoardPosition(0, 0), self))
-        pieces.append(Rook("black", BoardPosition(0, 7), self))
-
-        # Place Knights
-        pieces.append(Knight("white", BoardPosition(7, 1), self))
-        pieces.append(Knight("white", BoardPosition(7, 6), self))
-        pieces.append(Knight("black", BoardPosition(0, 1), self))
-        pieces.append(Knight("black", BoardPosition(0, 6), self))
-
-        # Place Bishops
-        pieces.append(Bishop("white", BoardPosition(7, 2), self))
-        pieces.append(Bishop("white", BoardPosition(7, 5), self))
-        pieces.append(Bishop("black", BoardPosition(0, 2), self))
-        pieces.append(Bishop("black", BoardPosition(0, 5), self))
-
-        # Place Queens
-        pieces.append(Queen("white", BoardPosition(7, 3), self))
-        pieces.append(Queen("black", BoardPosition(0, 3), self))
-
-        # Place Kings
-        pieces.append(King("white", BoardPosition(7, 4), self))
-        pieces.append(King("black", BoardPosition(0, 4), self))
-
-        return pieces
-
-    def draw(self, window: pygame.Surface):
-        for row in range(BOARD_DIM):
-            for col in range(BOARD_DIM):
-                pygame.draw.rect(window, self.colours[(row + col) % 2], (col * SQUARE_DIM, row * SQUARE_DIM,
-                                                                         SQUARE_DIM, SQUARE_DIM))
+            self.squares[square_index((0, col))] = BLACK | back_rank[col]
+            self.squares[square_index((1, col))] = BLACK | PAWN  # black pawns are on row 1
+            self.squares[square_index((6, col))] = WHITE | PAWN  # white pawns are on row 6
+            self.squares[square_index((7, col))] = WHITE | back_rank[col]
+
+
+class BoardView(Mapping):
+    """Read-only mapping from board positions to Piece objects. Pieces are built from the square array when they
+    are looked up, so they reflect the board at that moment and are not updated by later moves
+    """
+
+    def __init__(self, board: Board):
+        self.board = board
+
+    def __getitem__(self, pos: BoardPosition | tuple[int, int]) -> Piece:
+        row, col = pos
+        if 0 <= row < BOARD_DIM and 0 <= col < BOARD_DIM:
+            code = self.board.squares[row * 16 + col]
+            if code != EMPTY:
+                return make_piece(code, BoardPosition(row, col), self.board)
+        raise KeyError(pos)
+
+    def __contains__(self, pos) -> bool:
+        row, col = pos
+        return 0 <= row < BOARD_DIM and 0 <= col < BOARD_DIM and self.board.squares[row * 16 + col] != EMPTY
+
+    def __iter__(self) -> Iterator[BoardPosition]:
+        squares = self.board.squares
+        for square in SQUARES:
+            if squares[square] != EMPTY:
+                yield board_position(square)
+
+    def __len__(self) -> int:
+        return sum(1 for square in SQUARES if self.board.squares[square] != EMPTY)
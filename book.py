@@ -0,0 +1,126 @@
+import argparse
+import mmap
+import random
+import struct
+from collections import Counter
+from engine import Engine
+from moves import move_name, SQUARES_MASK
+from pgn import read_games, parse_san
+
+# A book file is the magic bytes followed by fixed-size entries of (position hash, move, weight), sorted by hash.
+# Moves are stored as just their start and end squares (the low 14 bits of a packed move). Positions are identified
+# by the engine's Zobrist keys, so books have to be rebuilt if zobrist.py changes
+MAGIC = b"CHESSBK1"
+ENTRY = struct.Struct("<QHH")
+HASH = struct.Struct("<Q")
+DEFAULT_PLIES = 12
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """Looks up book moves in a file through a read-only memory map, so the file is only read a page at a time
+    and processes using the same book share its pages
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"not an opening book: {path}")
+        self.size = (len(self.data) - len(MAGIC)) // ENTRY.size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def entry_hash(self, index: int) -> int:
+        return HASH.unpack_from(self.data, len(MAGIC) + index * ENTRY.size)[0]
+
+    def lookup(self, key: int) -> list[tuple[int, int]]:
+        """The book moves of a position with their weights, found by binary search on the hash. The moves only have
+        their start and end squares, 'choose' matches them up with the full legal moves
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry_hash(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        for index in range(low, self.size):
+            entry_key, move, weight = ENTRY.unpack_from(self.data, len(MAGIC) + index * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move, weight))
+        return moves
+
+    def choose(self, engine: Engine, rng: random.Random | None = None) -> int | None:
+        """Picks one of the position's book moves at random in proportion to their weights, or None if the
+        position isn't in the book. Moves that aren't legal (after a hash collision) are never picked
+        """
+        legal_moves = {move & SQUARES_MASK: move for move in engine.get_legal_moves()}
+        moves = [(legal_moves[move], weight) for move, weight in self.lookup(engine.hash)
+                 if move in legal_moves and weight > 0]
+        if len(moves) == 0:
+            return None
+        return (rng or random).choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def build_book(pgn_paths: list[str], output: str, plies: int = DEFAULT_PLIES, min_games: int = 1) -> int:
+    """Writes a book of the moves played in the first plies of every game, weighted by how often each was played.
+    Moves played in fewer than 'min_games' games are left out. A game is only followed up to the first move that
+    can't be read, e.g. an en passant capture. Returns the number of entries written
+    """
+    counts = Counter()
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for _, moves in read_games(file):
+                engine = Engine()
+                for text in moves[:plies]:
+                    try:
+                        move = parse_san(engine, text)
+                    except ValueError:
+                        break
+                    counts[(engine.hash, move & SQUARES_MASK)] += 1
+                    engine.push(move)
+
+    entries = sorted((key, move, min(count, MAX_WEIGHT)) for (key, move), count in counts.items()
+                     if count >= min_games)
+    with open(output, "wb") as file:
+        file.write(MAGIC)
+        data = bytearray(ENTRY.size * len(entries))
+        for index, entry in enumerate(entries):
+            ENTRY.pack_into(data, index * ENTRY.size, *entry)
+        file.write(data)
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or look up positions in an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("-o", "--output", default="book.bin")
+    build.add_argument("--plies", type=int, default=DEFAULT_PLIES, help="moves of each game to add to the book")
+    build.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games")
+    probe = commands.add_parser("probe", help="show the book moves of a position")
+    probe.add_argument("book")
+    probe.add_argument("fen", nargs="?", help="the position (default: the start position)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        entries = build_book(args.pgn, args.output, args.plies, args.min_games)
+        print(f"wrote {entries} entries to {args.output}")
+    else:
+        engine = Engine.from_fen(args.fen) if args.fen else Engine()
+        book = OpeningBook(args.book)
+        for move, weight in sorted(book.lookup(engine.hash), key=lambda entry: -entry[1]):
+            print(f"{move_name(move)} {weight}")
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
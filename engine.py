@@ -1,257 +1,583 @@
+import copy
+from array import array
 from board import Board
 from settings import *
-from pieces import Piece, Queen, Pawn, King
+from pieces import *
+from zobrist import PIECE_KEYS, CASTLING_KEYS, SIDE_KEY, compute_hash
+from evaluation import PIECE_SQUARE_TABLES, evaluate
+from moves import *
+
+# Castling rights are kept as bit flags
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = 15
+
+# The castling rights are and-ed with the mask of both squares of every move, so moving a king or rook (or
+# capturing a rook on its starting square) removes the rights that depend on it
+CASTLING_MASKS = [ALL_CASTLING_RIGHTS] * 128
+CASTLING_MASKS[square_index((7, 4))] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[square_index((7, 7))] &= ~WHITE_KINGSIDE
+CASTLING_MASKS[square_index((7, 0))] &= ~WHITE_QUEENSIDE
+CASTLING_MASKS[square_index((0, 4))] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[square_index((0, 7))] &= ~BLACK_KINGSIDE
+CASTLING_MASKS[square_index((0, 0))] &= ~BLACK_QUEENSIDE
+
+# States of the game returned by Engine.game_state
+PLAYING = "playing"
+CHECK = "check"
+CHECKMATE = "checkmate"
+STALEMATE = "stalemate"
+
+# A FEN's castling rights are checked against the kings and rooks of the start position
+START_SQUARES = Board().squares
+
+SLIDER_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+STEPPER_TARGETS = {KNIGHT: KNIGHT_TARGETS, KING: KING_TARGETS}
+# The tables of tables.py with each target square paired with the packed move to it, for move generation
+STEPPER_MOVES = {piece_type: [tuple((end, encode_move(start, end)) for end in targets[start]) for start in range(128)]
+                 for piece_type, targets in STEPPER_TARGETS.items()}
+SLIDER_MOVES = {piece_type: [tuple(tuple((end, encode_move(start, end)) for end in ray) for ray in rays[start])
+                             for start in range(128)]
+                for piece_type, rays in SLIDER_RAYS.items()}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+FEN_PIECES = {"p": PAWN, "n": KNIGHT, "b": BISHOP, "r": ROOK, "q": QUEEN, "k": KING}
+FEN_LETTERS = {code | colour: letter.upper() if colour == WHITE else letter
+               for letter, code in FEN_PIECES.items() for colour in (WHITE, BLACK)}
+FEN_CASTLING = {"K": WHITE_KINGSIDE, "Q": WHITE_QUEENSIDE, "k": BLACK_KINGSIDE, "q": BLACK_QUEENSIDE}
 
 
 class Engine:
-    def __init__(self):
-        self.board = Board()
-        self.turn = "white"  # white moves first
-        self.move_log: list[Move] = []  # track moves made in the game
+    def __init__(self, board: Board | None = None, side: int = WHITE, castling_rights: int = ALL_CASTLING_RIGHTS,
+                 halfmove_clock: int = 0, fullmove_number: int = 1):
+        self.board = Board() if board is None else board
+        self.side = side  # white moves first
+        self.castling_rights = castling_rights
+        self.halfmove_clock = halfmove_clock  # moves since the last capture or pawn move, for the 50-move rule
+        self.fullmove_number = fullmove_number  # starts at 1 and goes up after each of black's moves
+        self.move_log = array("l")  # the packed moves made in the game, see moves.py
+        # What a move can't be undone without, pushed with each move: the hash before it, the castling rights and
+        # score packed as 'castling_rights | score << 4', and the halfmove clock, which has no upper bound in a FEN
+        self.hash_history = array("Q")
+        self.state_history = array("q")
+        self.clock_history = array("q")
+        self.hash = compute_hash(self.board.squares, self.side, self.castling_rights)  # Zobrist key, see zobrist.py
+        self.score = evaluate(self.board.squares)  # material and square score in centipawns, from white's view
+        self.piece_count = sum(1 for square in SQUARES if self.board.squares[square] != EMPTY)  # including kings
+        self.king_squares = {colour: next((square for square in SQUARES
+                                           if self.board.squares[square] == colour | KING), -1)
+                             for colour in (WHITE, BLACK)}
+        # Squares attacked by each colour (indexed by colour >> 3), worked out when first needed in a position
+        self.attack_maps: list[bytearray | None] = [None, None]
+        # The game state and legal moves grouped by start square, worked out when the GUI first asks for them in a
+        # position. The table is never modified, only replaced, so copies can share it
+        self.position_status: tuple[str, dict[int, list[int]]] | None = None
+
+    def copy(self) -> "Engine":
+        """An independent copy of the game, e.g. for a search running in another thread"""
+        engine = copy.copy(self)
+        engine.board = self.board.copy()
+        engine.move_log = self.move_log[:]
+        engine.hash_history = self.hash_history[:]
+        engine.state_history = self.state_history[:]
+        engine.clock_history = self.clock_history[:]
+        engine.king_squares = dict(self.king_squares)
+        engine.attack_maps = [None, None]
+        return engine
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Engine":
+        """Sets up a position from Forsyth-Edwards Notation. The en passant field is ignored since the engine
+        doesn't play en passant, and castling rights whose king or rook isn't on its starting square are dropped.
+        Raises ValueError if the FEN can't be read or describes a position that can't arise in a game
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"incomplete FEN: {fen}")
+        rows = fields[0].split("/")
+        if len(rows) != BOARD_DIM:
+            raise ValueError(f"FEN board doesn't have 8 rows: {fen}")
+
+        squares = [EMPTY] * 128
+        for row, text in enumerate(rows):  # FEN starts from black's back rank, which is row 0 here too
+            col = 0
+            for char in text:
+                if char in "12345678":
+                    col += int(char)
+                elif char.lower() in FEN_PIECES and col < BOARD_DIM:
+                    squares[row * 16 + col] = FEN_PIECES[char.lower()] | (WHITE if char.isupper() else BLACK)
+                    col += 1
+                else:
+                    raise ValueError(f"bad FEN board: {fen}")
+            if col != BOARD_DIM:
+                raise ValueError(f"FEN row {row + 1} doesn't have 8 squares: {fen}")
+        for colour in (WHITE, BLACK):
+            if squares.count(colour | KING) != 1:
+                raise ValueError(f"FEN doesn't have exactly one {COLOUR_NAMES[colour]} king: {fen}")
+        # Move generation assumes every pawn has a square in front of it, and one on the last rank would have promoted
+        for square in SQUARES:
+            if squares[square] & TYPE_MASK == PAWN and (square < 16 or square >= 112):
+                raise ValueError(f"FEN has a pawn on the first or last rank: {fen}")
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"bad FEN side to move: {fen}")
+        castling_rights = 0
+        if fields[2] != "-":
+            for char in fields[2]:
+                if char not in FEN_CASTLING:
+                    raise ValueError(f"bad FEN castling rights: {fen}")
+                castling_rights |= FEN_CASTLING[char]
+        # Only keep the rights the engine could have, the masks remove them once a king or rook has left its square
+        for square in SQUARES:
+            if squares[square] != START_SQUARES[square]:
+                castling_rights &= CASTLING_MASKS[square]
+
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"bad FEN move counters: {fen}") from None
+        if halfmove_clock < 0 or fullmove_number < 1:
+            raise ValueError(f"bad FEN move counters: {fen}")
+
+        engine = cls(Board(squares), WHITE if fields[1] == "w" else BLACK, castling_rights, halfmove_clock,
+                     fullmove_number)
+        # The side that just moved can't have left its own king in check, the king could otherwise be captured. The
+        # attack map covers the king too, so kings standing next to each other are caught as well
+        if engine.is_attacked(engine.king_squares[engine.side ^ BLACK], engine.side):
+            raise ValueError(f"FEN side not to move is in check: {fen}")
+        return engine
+
+    def to_fen(self) -> str:
+        squares = self.board.squares
+        rows = []
+        for row in range(BOARD_DIM):
+            text = ""
+            empty = 0
+            for col in range(BOARD_DIM):
+                piece = squares[row * 16 + col]
+                if piece == EMPTY:
+                    empty += 1
+                else:
+                    text += (str(empty) if empty else "") + FEN_LETTERS[piece]
+                    empty = 0
+            rows.append(text + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in FEN_CASTLING.items() if self.castling_rights & right) or "-"
+        return (f"{'/'.join(rows)} {'w' if self.side == WHITE else 'b'} {castling} - {self.halfmove_clock} "
+                f"{self.fullmove_number}")
+
+    @property
+    def turn(self) -> str:
+        return COLOUR_NAMES[self.side]
 
     def switch_turn(self):
-        self.turn = "black" if self.turn == "white" else "white"
+        self.side ^= BLACK
 
     def make_move(self, start_square: BoardPosition | tuple[int, int], end_square: BoardPosition | tuple[int, int]):
-        piece_to_move = self.board.dict.pop(start_square)  # remove piece from start square
-
-        is_promotion = False
-        # Check for pawn promotion
-        if piece_to_move.name == "Pawn":
-            if ((piece_to_move.colour == "white" and end_square[0] == 0) or
-                    (piece_to_move.colour == "black" and end_square[0] == 7)):
-                piece_to_move = Queen(piece_to_move.colour, piece_to_move.pos, self.board)
-                is_promotion = True
-
-        # If the King or a rook was moved, keep track of whether it could castle before the move was made
-        original_can_castle = False
-        if piece_to_move.name in ["King", "Rook"]:
-            original_can_castle = piece_to_move.can_castle
-            piece_to_move.can_castle = False  # king/rook can no longer castle due to it being moved
-
-        # Check if a castle move was made
-        is_castle_move = False
-        if piece_to_move.name == "King" and abs(end_square[1] - start_square[1]) == 2:
-            row, col = end_square
-            # King-side castling
-            if end_square[1] - start_square[1] == 2:
-                rook = self.board.dict.pop((row, 7))  # remove rook from old position
-                new_pos = (row, col - 1)  # rook goes to the left of the king
-                rook.move(new_pos)
-                self.board.dict[new_pos] = rook
-                rook.can_castle = False
-                is_castle_move = True
-
-            # Queen-side castling
-            else:
-                rook = self.board.dict.pop((row, 0))  # remove rook from old position
-                new_pos = (row, col + 1)  # rook goes to the right of the king
-                rook.move(new_pos)
-                self.board.dict[new_pos] = rook
-                rook.can_castle = False
-                is_castle_move = True
-
-        # Update the move log
-        piece_captured = self.board.dict.get(end_square)
-        self.move_log.append(
-            Move(start_square, end_square, piece_captured, is_promotion, is_castle_move, original_can_castle))
+        self.push(self.encode_move(square_index(start_square), square_index(end_square)))
+
+    def encode_move(self, start: int, end: int) -> int:
+        """The packed move between two squares in this position, with its captured piece and flags filled in"""
+        squares = self.board.squares
+        piece = squares[start] & TYPE_MASK
+        flags = 0
+        if piece == PAWN and (end < 16 or end >= 112):
+            flags = PROMOTION
+        elif piece == KING and (end - start == 2 or start - end == 2):
+            flags = CASTLE
+        return start | end << END_SHIFT | squares[end] << CAPTURE_SHIFT | flags
+
+    def push(self, move: int):
+        """Makes a packed move, as returned by get_legal_moves"""
+        start = move & SQUARE_MASK
+        end = move >> END_SHIFT & SQUARE_MASK
+        squares = self.board.squares
+        piece_moved = squares[start]
+        piece_captured = squares[end]
+
+        # Pawns promote when they reach row 0 or 7
+        piece_placed = piece_moved + (QUEEN - PAWN) if move & PROMOTION else piece_moved
+
+        # Save what is needed to undo the move
+        self.move_log.append(move)
+        self.hash_history.append(self.hash)
+        self.state_history.append(self.castling_rights | self.score << 4)
+        self.clock_history.append(self.halfmove_clock)
+        if piece_captured != EMPTY:
+            self.piece_count -= 1
+        if piece_moved & TYPE_MASK == PAWN or piece_captured != EMPTY:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if piece_moved & BLACK:
+            self.fullmove_number += 1
+
+        # Check if a castle move was made, in which case the rook is moved too
+        key = self.hash
+        score = self.score
+        if piece_moved & TYPE_MASK == KING:
+            self.king_squares[piece_moved & BLACK] = end
+            if move & CASTLE:
+                if end > start:  # King-side castling, the rook goes to the left of the king
+                    rook_start, rook_end = end + 1, end - 1
+                else:  # Queen-side castling, the rook goes to the right of the king
+                    rook_start, rook_end = end - 2, end + 1
+                rook = squares[rook_start]
+                squares[rook_end] = rook
+                squares[rook_start] = EMPTY
+                key ^= PIECE_KEYS[rook][rook_start] ^ PIECE_KEYS[rook][rook_end]
+                score += PIECE_SQUARE_TABLES[rook][rook_end] - PIECE_SQUARE_TABLES[rook][rook_start]
 
         # Move piece to end square
-        piece_to_move.move(end_square)
-        self.board.dict[end_square] = piece_to_move
-
-        self.switch_turn()
+        squares[start] = EMPTY
+        squares[end] = piece_placed
+        castling_rights = self.castling_rights & CASTLING_MASKS[start] & CASTLING_MASKS[end]
+
+        self.hash = (key ^ PIECE_KEYS[piece_moved][start] ^ PIECE_KEYS[piece_captured][end] ^
+                     PIECE_KEYS[piece_placed][end] ^ CASTLING_KEYS[self.castling_rights] ^
+                     CASTLING_KEYS[castling_rights] ^ SIDE_KEY)
+        self.score = (score + PIECE_SQUARE_TABLES[piece_placed][end] - PIECE_SQUARE_TABLES[piece_moved][start] -
+                      PIECE_SQUARE_TABLES[piece_captured][end])
+        self.castling_rights = castling_rights
+        self.side ^= BLACK
+        self.attack_maps[0] = self.attack_maps[1] = None
+        self.position_status = None
+
+    def push_null(self):
+        """Passes the turn without moving, for the search's null-move pruning. It is taken back by 'undo_move' like
+        any other move. Must not be used when the side to move is in check
+        """
+        self.move_log.append(NO_MOVE)
+        self.hash_history.append(self.hash)
+        self.state_history.append(self.castling_rights | self.score << 4)
+        self.clock_history.append(self.halfmove_clock)
+        self.hash ^= SIDE_KEY
+        self.side ^= BLACK
+        self.position_status = None  # the board hasn't changed so the attack maps still hold
 
     def undo_move(self):
-        if len(self.move_log) > 0:
-            previous_move = self.move_log.pop(-1)
-            piece_moved = self.board.dict.pop(previous_move.end_square)
-
-            # Undo promotion
-            if previous_move.is_promotion:
-                piece_moved = Pawn(piece_moved.colour, piece_moved.pos, self.board)  # demote queen back to a pawn
-
-            # Move the piece back to its original place
-            self.board.dict[previous_move.start_square] = piece_moved
-            piece_moved.move(previous_move.start_square)
-
-            # If a piece was captured then place it back on the board
-            if previous_move.piece_captured is not None:
-                self.board.dict[previous_move.end_square] = previous_move.piece_captured
-
-            # Undo castle move
-            if previous_move.is_castle_move:
-                piece_moved.can_castle = True  # if a castle move was made then the piece moved is the king
-                end_row, end_col = previous_move.end_square
-                # Undo King-side castle
-                if previous_move.end_square[1] - previous_move.start_square[1] == 2:
-                    rook = self.board.dict.pop((end_row, end_col - 1))  # Rook will be 1 to the left of the king
-                    rook.move((end_row, 7))
-                    self.board.dict[(end_row, 7)] = rook
-                    rook.can_castle = True
-
-                # Undo Queen-side castle
-                else:
-                    rook = self.board.dict.pop((end_row, end_col + 1))
-                    rook.move((end_row, 0))
-                    self.board.dict[(end_row, 0)] = rook
-                    rook.can_castle = True
-
-            # Restore previous castling rights if the king or rook was moved (but wasn't a castle move)
-            elif piece_moved.name in ["King", "Rook"]:
-                piece_moved.can_castle = previous_move.original_can_castle
+        if len(self.move_log) > 0 and self.move_log[-1] == NO_MOVE:
+            self.move_log.pop()
+            self.state_history.pop()
+            self.clock_history.pop()
+            self.hash = self.hash_history.pop()
+            self.side ^= BLACK
+            self.position_status = None
+        elif len(self.move_log) > 0:
+            move = self.move_log.pop()
+            start = move & SQUARE_MASK
+            end = move >> END_SHIFT & SQUARE_MASK
+            squares = self.board.squares
+            piece_moved = squares[end]
+            if move & PROMOTION:
+                piece_moved = (piece_moved & BLACK) | PAWN
+
+            # Move the piece back to its original place and place any captured piece back on the board
+            squares[start] = piece_moved
+            squares[end] = move >> CAPTURE_SHIFT & PIECE_MASK
+            if squares[end] != EMPTY:
+                self.piece_count += 1
+
+            if piece_moved & TYPE_MASK == KING:
+                self.king_squares[piece_moved & BLACK] = start
+                # Undo castle move
+                if move & CASTLE:
+                    if end > start:  # Undo King-side castle
+                        squares[end + 1] = squares[end - 1]
+                        squares[end - 1] = EMPTY
+                    else:  # Undo Queen-side castle
+                        squares[end - 2] = squares[end + 1]
+                        squares[end + 1] = EMPTY
+
+            state = self.state_history.pop()
+            self.castling_rights = state & 0xF
+            self.score = state >> 4
+            self.halfmove_clock = self.clock_history.pop()
+            self.hash = self.hash_history.pop()
+            if piece_moved & BLACK:
+                self.fullmove_number -= 1
 
             # Reverse the turn
-            self.switch_turn()
+            self.side ^= BLACK
+            self.attack_maps[0] = self.attack_maps[1] = None
+            self.position_status = None
 
     def reset(self):
         for _ in range(len(self.move_log)):
             self.undo_move()
 
-    def is_attacked(self, square: BoardPosition) -> bool:
-        # Check diagonals for enemy bishops/queen/king
-        directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        for direction in directions:
-            for i in range(1, 8):
-                pos = (square[0] + direction[0] * i, square[1] + direction[1] * i)
-                if pos[0] < 0 or pos[0] > BOARD_DIM or pos[1] < 0 or pos[1] > BOARD_DIM:
-                    break  # no longer need to search direction as we are off the board
-
-                if pos in self.board.dict:
-                    piece = self.board.dict[pos]
-                    if i == 1:
-                        if piece.colour != self.turn and piece.name in ["Bishop", "Queen", "King"]:
-                            return True
-                        else:
-                            break  # no longer need to check the direction
-                    else:
-                        if piece.colour != self.turn and piece.name in ["Bishop", "Queen"]:
-                            return True
-                        else:
+    def attack_map(self, colour: int) -> bytearray:
+        """The squares attacked by the given colour, as a 0x88-indexed array of flags. The opposing king does not
+        block the lines of sliding pieces, so a square behind it on a checking line counts as attacked (the king
+        can't escape the check by moving there). The map is computed at most once per position
+        """
+        attacks = self.attack_maps[colour >> 3]
+        if attacks is not None:
+            return attacks
+
+        attacks = bytearray(128)
+        squares = self.board.squares
+        enemy_king = (colour ^ BLACK) | KING
+        pawn_attacks = PAWN_ATTACKS[colour >> 3]
+        for start in SQUARES:
+            piece = squares[start]
+            if piece == EMPTY or piece & BLACK != colour:
+                continue
+            piece_type = piece & TYPE_MASK
+
+            if piece_type == PAWN:
+                for pos in pawn_attacks[start]:
+                    attacks[pos] = 1
+            elif piece_type == KNIGHT or piece_type == KING:
+                for pos in STEPPER_TARGETS[piece_type][start]:
+                    attacks[pos] = 1
+            else:
+                for ray in SLIDER_RAYS[piece_type][start]:
+                    for pos in ray:
+                        attacks[pos] = 1
+                        if squares[pos] != EMPTY and squares[pos] != enemy_king:
                             break
 
-        # Check horizontally and vertically for enemy rooks/queen/king
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-        for direction in directions:
-            for i in range(1, 8):
-                pos = (square[0] + direction[0] * i, square[1] + direction[1] * i)
-                if pos[0] < 0 or pos[0] > BOARD_DIM or pos[1] < 0 or pos[1] > BOARD_DIM:
-                    break
-
-                if pos in self.board.dict:
-                    piece = self.board.dict[pos]
-                    if i == 1:
-                        if piece.colour != self.turn and piece.name in ["Rook", "Queen", "King"]:
-                            return True
-                        else:
-                            break
-                    else:
-                        if piece.colour != self.turn and piece.name in ["Rook", "Queen"]:
-                            return True
-                        else:
-                            break
+        self.attack_maps[colour >> 3] = attacks
+        return attacks
+
+    def is_attacked(self, square: int, attacker: int | None = None) -> bool:
+        """Whether the square is attacked by the given colour, which defaults to the opponent of the side to move"""
+        if attacker is None:
+            attacker = self.side ^ BLACK
+        return self.attack_map(attacker)[square] == 1
+
+    def king_square(self, colour: int) -> int:
+        return self.king_squares[colour]
+
+    def in_check(self) -> bool:
+        attacks = self.attack_maps[(self.side ^ BLACK) >> 3]
+        if attacks is not None:
+            return attacks[self.king_squares[self.side]] == 1
+        # Looking outwards from the king is much cheaper than building the attack map
+        return self.find_checks_and_pins(self.king_squares[self.side])[0] > 0
+
+    def has_non_pawn_material(self, colour: int) -> bool:
+        """Whether the colour has a piece other than its king and pawns"""
+        squares = self.board.squares
+        for square in SQUARES:
+            piece = squares[square]
+            if piece != EMPTY and piece & BLACK == colour and KNIGHT <= piece & TYPE_MASK <= QUEEN:
+                return True
+        return False
 
-        # Check for enemy knights
-        directions = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
-        for direction in directions:
-            pos = (square[0] + direction[0], square[1] + direction[1])
-            if pos[0] < 0 or pos[0] > BOARD_DIM or pos[1] < 0 or pos[1] > BOARD_DIM:
-                continue
+    def generate_moves(self, captures_only: bool = False) -> list[int]:
+        """Pseudo-legal moves for the side to move as packed moves, i.e. ignoring whether they leave the king in
+        check. Castling is added separately by 'castle_moves' since it depends on attacked squares.
 
-            if pos in self.board.dict:
-                piece = self.board.dict[pos]
-                if piece.colour != self.turn and piece.name == "Knight":
-                    return True
+        With 'captures_only' only captures and promotions are generated, for the quiescence search
+        """
+        # The moves are packed by hand, the shifts being END_SHIFT and CAPTURE_SHIFT from moves.py
+        moves = []
+        side = self.side
+        squares = self.board.squares
+        for start in SQUARES:
+            piece = squares[start]
+            if piece == EMPTY or piece & BLACK != side:
+                continue
+            piece_type = piece & TYPE_MASK
+
+            if piece_type == PAWN:
+                forward = -16 if side == WHITE else 16
+                end = start + forward
+                flags = PROMOTION if end < 16 or end >= 112 else 0
+                if squares[end] == EMPTY and (not captures_only or flags):
+                    moves.append(start | end << 7 | flags)
+                    # Can move 2 squares forward if still on the start row
+                    if (start >> 4 == (6 if side == WHITE else 1) and squares[end + forward] == EMPTY and
+                            not captures_only):
+                        moves.append(start | (end + forward) << 7)
+                for end in PAWN_ATTACKS[side >> 3][start]:
+                    target = squares[end]
+                    if target != EMPTY and target & BLACK != side:
+                        moves.append(start | end << 7 | target << 14 | flags)
+
+            elif piece_type == KNIGHT or piece_type == KING:
+                for end, move in STEPPER_MOVES[piece_type][start]:
+                    target = squares[end]
+                    if target == EMPTY:
+                        if not captures_only:
+                            moves.append(move)
+                    elif target & BLACK != side:
+                        moves.append(move | target << 14)
 
-        # Check for enemy pawns
-        dy = -1 if self.turn == "white" else 1
-        for dx in [1, -1]:
-            pos = (square[0] + dy, square[1] + dx)
-            if pos in self.board.dict:
-                piece = self.board.dict[pos]
-                if piece.colour != self.turn and piece.name == "Pawn":
-                    return True
+            else:
+                for ray in SLIDER_MOVES[piece_type][start]:
+                    for end, move in ray:
+                        target = squares[end]
+                        if target == EMPTY:
+                            if not captures_only:
+                                moves.append(move)
+                        else:
+                            if target & BLACK != side:
+                                moves.append(move | target << 14)
+                            break
 
-    def in_check(self):
-        king = next(piece for piece in self.board.dict.values() if piece.name == "King" and piece.colour == self.turn)
-        return self.is_attacked(king.pos)
+        return moves
 
-    def legal_moves(self, piece: Piece) -> list[BoardPosition]:
-        """Filters a piece's possible moves to not include those that will put the king in check"""
-        legal_moves = []
-        start_square = piece.pos
-
-        # Apply each possible move and check that the king is not left in danger
-        for end_square in piece.get_possible_moves():
-            self.make_move(start_square, end_square)
-            # Want to check if the team that made the move is in check so need to switch the turn
-            self.switch_turn()
-            if not self.in_check():
-                legal_moves.append(end_square)
-            self.switch_turn()
-            self.undo_move()
+    def castle_moves(self) -> list[int]:
+        """Castling moves for the side to move, which is assumed not to be in check"""
+        castle_moves = []
+        if self.side == WHITE:
+            kingside_right, queenside_right = WHITE_KINGSIDE, WHITE_QUEENSIDE
+            king = square_index((7, 4))
+        else:
+            kingside_right, queenside_right = BLACK_KINGSIDE, BLACK_QUEENSIDE
+            king = square_index((0, 4))
+
+        # The rights are only kept while the king and rook are unmoved on their starting squares
+        if self.castling_rights & (kingside_right | queenside_right):
+            squares = self.board.squares
+            attacked = self.attack_map(self.side ^ BLACK)
+            # Allowed to castle if the squares between the king and rook are empty and the squares the king moves
+            # over are not being attacked
+            if (self.castling_rights & kingside_right and squares[king + 1] == EMPTY and squares[king + 2] == EMPTY
+                    and not attacked[king + 1] and not attacked[king + 2]):
+                castle_moves.append(king | (king + 2) << END_SHIFT | CASTLE)
+            if (self.castling_rights & queenside_right and squares[king - 1] == EMPTY and
+                    squares[king - 2] == EMPTY and squares[king - 3] == EMPTY and
+                    not attacked[king - 1] and not attacked[king - 2]):
+                castle_moves.append(king | (king - 2) << END_SHIFT | CASTLE)
+        return castle_moves
 
-        if piece.name == "King":
-            legal_moves += self.add_castle_moves(piece)
+    def find_checks_and_pins(self, king: int) -> tuple[int, set[int] | None, dict[int, set[int]]]:
+        """Looks outwards from the king of the side to move to find the enemy pieces giving check and the friendly
+        pieces pinned to the king.
+
+        Returns the number of checking pieces, the squares a move must land on to block or capture a single checking
+        piece (None when not in check), and for each pinned piece the squares it can move to without leaving the
+        line of its pin
+        """
+        side = self.side
+        enemy = side ^ BLACK
+        squares = self.board.squares
+        checkers = 0
+        check_squares = None
+        pins = {}
+
+        queen = enemy | QUEEN
+        for sliding_piece, rays in ((enemy | BISHOP, BISHOP_RAYS[king]), (enemy | ROOK, ROOK_RAYS[king])):
+            for ray in rays:
+                pinned = None
+                for index, pos in enumerate(ray):
+                    piece = squares[pos]
+                    if piece != EMPTY:
+                        if piece & BLACK == side:
+                            if pinned is not None:
+                                break  # two friendly pieces in the way, so neither is pinned
+                            pinned = pos
+                        else:
+                            if piece == sliding_piece or piece == queen:
+                                # The squares from the king up to and including the enemy piece
+                                line = set(ray[:index + 1])
+                                if pinned is None:
+                                    checkers += 1
+                                    check_squares = line
+                                else:
+                                    line.remove(pinned)
+                                    pins[pinned] = line
+                            break
 
+        knight = enemy | KNIGHT
+        for pos in KNIGHT_TARGETS[king]:
+            if squares[pos] == knight:
+                checkers += 1
+                check_squares = {pos}
+
+        # Enemy pawns attack the king from the squares a pawn of the king's colour would attack from its square
+        pawn = enemy | PAWN
+        for pos in PAWN_ATTACKS[side >> 3][king]:
+            if squares[pos] == pawn:
+                checkers += 1
+                check_squares = {pos}
+
+        return checkers, check_squares, pins
+
+    def get_legal_moves(self, captures_only: bool = False) -> list[int]:
+        """Generates the legal moves directly by working out the checks and pins once for the position, instead of
+        playing each pseudo-legal move to see whether it leaves the king in check. With 'captures_only' only
+        captures and promotions are returned
+        """
+        king = self.king_squares[self.side]
+        checkers, check_squares, pins = self.find_checks_and_pins(king)
+        attacked = None  # the enemy attack map is only needed if the king has somewhere to move
+
+        moves = self.generate_moves(captures_only)
+        if checkers == 0 and not pins:
+            # Only the king's moves need checking, which is most positions
+            legal_moves = [move for move in moves if move & 0x7F != king]
+            if len(legal_moves) < len(moves):
+                attacked = self.attack_map(self.side ^ BLACK)
+                legal_moves += [move for move in moves if move & 0x7F == king and not attacked[move >> 7 & 0x7F]]
+        else:
+            legal_moves = []
+            for move in moves:
+                start = move & 0x7F
+                if start == king:
+                    if attacked is None:
+                        attacked = self.attack_map(self.side ^ BLACK)
+                    if not attacked[move >> 7 & 0x7F]:
+                        legal_moves.append(move)
+                # In double check only the king can move
+                elif checkers < 2:
+                    # A pinned piece has to stay on the line between the king and the pinning piece and when in
+                    # check the move has to capture the checking piece or block its line
+                    end = move >> 7 & 0x7F
+                    if start in pins and end not in pins[start]:
+                        continue
+                    if check_squares is not None and end not in check_squares:
+                        continue
+                    legal_moves.append(move)
+
+        if checkers == 0 and not captures_only:
+            legal_moves += self.castle_moves()
         return legal_moves
 
+    def parse_move(self, text: str) -> int:
+        """Finds the legal move written in coordinate notation, e.g. 'e2e4' (a trailing promotion piece letter is
+        accepted but pawns always promote to a queen)
+        """
+        move = self.encode_move(parse_square(text[0:2]), parse_square(text[2:4]))
+        if move not in self.get_legal_moves():
+            raise ValueError(f"illegal move: {text}")
+        return move
+
+    def legal_move_table(self) -> dict[int, list[int]]:
+        """The legal moves of the position grouped by start square, which the GUI looks up every frame"""
+        return self.status()[1]
+
+    def game_state(self) -> str:
+        """One of PLAYING, CHECK, CHECKMATE or STALEMATE, worked out once per position"""
+        return self.status()[0]
+
+    def status(self) -> tuple[str, dict[int, list[int]]]:
+        if self.position_status is None:
+            table = {}
+            for move in self.get_legal_moves():
+                table.setdefault(move & SQUARE_MASK, []).append(move >> END_SHIFT & SQUARE_MASK)
+            if self.in_check():
+                state = CHECK if table else CHECKMATE
+            else:
+                state = PLAYING if table else STALEMATE
+            self.position_status = (state, table)
+        return self.position_status
+
+    def legal_moves(self, piece: Piece) -> list[BoardPosition]:
+        """The squares a piece can legally move to, as board positions for the GUI"""
+        return [board_position(end) for end in self.legal_move_table().get(square_index(piece.pos), ())]
+
     def is_checkmate(self) -> bool:
         # Checkmate if king is in check and there are no possible legal moves
-        if self.in_check():
-            for piece in list(self.board.dict.values()):
-                if piece.colour == self.turn:
-                    if len(self.legal_moves(piece)) > 0:
-                        return False  # If any piece can move, it's not checkmate
-            return True  # If no piece can move, it's checkmate
-        return False  # If the king is not in check, it's not checkmate
+        return self.game_state() == CHECKMATE
 
     def is_stalemate(self) -> bool:
         # Stalemate if there are no possible legal moves while king is not in check
-        if not self.in_check():
-            for piece in list(self.board.dict.values()):
-                if piece.colour == self.turn:
-                    if len(self.legal_moves(piece)) > 0:
-                        return False
-            return True
-        return False
-
-    def add_castle_moves(self, king: King) -> list[BoardPosition]:
-        castle_moves = []
-        if not self.in_check() and king.can_castle:  # cannot castle whilst in check
-            # King-side castling
-            kingside_piece = self.board.dict.get((king.pos[0], 7))
-            if kingside_piece is not None and kingside_piece.name == "Rook":
-                # Allowed to castle if the square the king has to move over is not being attacked
-                if (kingside_piece.can_castle and not self.is_attacked(BoardPosition(king.pos[0], 5)) and
-                        not self.is_attacked(BoardPosition(king.pos[0], 6))):
-                    if (king.pos[0], 5) not in self.board.dict and (king.pos[0], 6) not in self.board.dict:
-                        castle_moves.append(BoardPosition(king.pos[0], 6))
-            # Queen-side castling
-            queenside_piece = self.board.dict.get((king.pos[0], 0))
-            if queenside_piece is not None and queenside_piece.name == "Rook":
-                # Allowed to castle if the square the king has to move over is not being attacked
-                if (queenside_piece.can_castle and not self.is_attacked(BoardPosition(king.pos[0], 3)) and
-                        not self.is_attacked(BoardPosition(king.pos[0], 2))):
-                    if (king.pos[0], 3) not in self.board.dict and (king.pos[0], 2) not in self.board.dict:
-                        castle_moves.append(BoardPosition(king.pos[0], 2))
-        return castle_moves
-
-    def get_legal_moves(self) -> list[tuple[BoardPosition, BoardPosition]]:
-        moves = []
-        for piece in list(self.board.dict.values()):
-            if piece.colour == self.turn:
-                for end_square in self.legal_moves(piece):
-                    moves.append((piece.pos, end_square))
-        return moves
-
-
-class Move:
-    def __init__(self, start_square: BoardPosition, end_square: BoardPosition, piece_captured: Piece,
-                 is_promotion: bool, is_castle_move: bool, original_can_castle: bool = False):
-        self.start_square = start_square
-        self.end_square = end_square
-        self.piece_captured = piece_captured
-        self.is_promotion = is_promotion
-        self.is_castle_move = is_castle_move
-        self.original_can_castle = original_can_castle  # to let the king/rooks castle when moved and the move is undone
+        return self.game_state() == STALEMATE
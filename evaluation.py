@@ -0,0 +1,147 @@
+import functools
+from collections.abc import Iterable
+from settings import SQUARES
+from pieces import *
+
+# Material values in centipawns, indexed by piece type (the pieces' own values are in tenths of a pawn)
+MATERIAL_VALUES = [value * 10 for value in PIECE_VALUES]
+
+# Piece square tables in centipawns, written from white's point of view (row 0 is black's back rank)
+PAWN_SCORES = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5, 5, 10, 25, 25, 10, 5, 5],
+    [0, 0, 0, 20, 20, 0, 0, 0],
+    [5, -5, -10, 0, 0, -10, -5, 5],
+    [5, 10, 10, -20, -20, 10, 10, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+KNIGHT_SCORES = [
+    [-50, -40, -30, -30, -30, -30, -40, -50],
+    [-40, -20, 0, 0, 0, 0, -20, -40],
+    [-30, 0, 10, 15, 15, 10, 0, -30],
+    [-30, 5, 15, 20, 20, 15, 5, -30],
+    [-30, 0, 15, 20, 20, 15, 0, -30],
+    [-30, 5, 10, 15, 15, 10, 5, -30],
+    [-40, -20, 0, 5, 5, 0, -20, -40],
+    [-50, -40, -30, -30, -30, -30, -40, -50]
+]
+
+BISHOP_SCORES = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]
+]
+
+ROOK_SCORES = [
+    [0, 0, 0, 5, 5, 0, 0, 0],
+    [5, 0, 0, 0, 0, 0, 0, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+QUEEN_SCORES = [
+    [-10, -5, -5, -2, -2, -5, -5, -10],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 2, 2, 2, 2, 0, -5],
+    [-2, 0, 2, 2, 2, 2, 0, -2],
+    [0, 0, 2, 2, 2, 2, 0, 0],
+    [-5, 2, 2, 2, 2, 2, 2, -5],
+    [-5, 0, 2, 0, 0, 0, 0, -5],
+    [-10, -5, -5, -2, -2, -5, -5, -10]
+]
+
+KING_SCORES = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]
+]
+
+# Map piece types to their respective scores
+SQUARE_VALUES = {
+    PAWN: PAWN_SCORES,
+    KNIGHT: KNIGHT_SCORES,
+    BISHOP: BISHOP_SCORES,
+    ROOK: ROOK_SCORES,
+    QUEEN: QUEEN_SCORES,
+    KING: KING_SCORES
+}
+
+
+def build_piece_square_tables() -> list[list[int]]:
+    """Combines material and square scores into one flat 0x88 table per piece code. Black's tables are flipped
+    vertically and negated so that every score is from white's point of view and can simply be added up
+    """
+    tables = [[0] * 128 for _ in range(16)]
+    for piece_type, scores in SQUARE_VALUES.items():
+        for square in SQUARES:
+            row, col = square >> 4, square & 7
+            tables[WHITE | piece_type][square] = MATERIAL_VALUES[piece_type] + scores[row][col]
+            tables[BLACK | piece_type][square] = -(MATERIAL_VALUES[piece_type] + scores[7 - row][col])
+    return tables
+
+
+# Indexed by piece code then square. The EMPTY code's table is all 0 so captures of empty squares need no check
+PIECE_SQUARE_TABLES = build_piece_square_tables()
+
+
+def evaluate(squares: list[int]) -> int:
+    """Scores a board from scratch, from white's point of view. The engine only does this when a position is set up
+    and afterwards updates the score as moves are made
+    """
+    return sum(PIECE_SQUARE_TABLES[piece][square] for square, piece in enumerate(squares))
+
+
+# Batch evaluation, for scoring many positions at once outside the search (e.g. labelling or tuning data). Boards are
+# given with one entry per square in the order of the board's rows and columns (a8, b8, ..., h1), either as piece
+# codes, shape (N, 64), or as one plane of 0/1 flags per piece in the order of PLANE_PIECES, shape (N, 12, 64).
+# NumPy is only needed for this and is imported when it is first used
+PLANE_PIECES = [colour | piece_type for colour in (WHITE, BLACK) for piece_type in (PAWN, KNIGHT, BISHOP, ROOK,
+                                                                                      QUEEN, KING)]
+
+
+@functools.cache
+def batch_tables():
+    """PIECE_SQUARE_TABLES as NumPy arrays over the 64 squares, indexed by piece code and by plane"""
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("batch evaluation needs NumPy") from None
+    by_code = np.array([[table[square] for square in SQUARES] for table in PIECE_SQUARE_TABLES], dtype=np.int32)
+    return by_code, by_code[PLANE_PIECES]
+
+
+def encode_boards(boards: Iterable[list[int]]):
+    """Packs 0x88 boards (such as 'Board.squares') into an (N, 64) int8 array of piece codes for 'evaluate_batch'"""
+    import numpy as np
+    return np.array([[squares[square] for square in SQUARES] for squares in boards], dtype=np.int8).reshape(-1, 64)
+
+
+def evaluate_batch(boards):
+    """Scores many boards at once, from white's point of view, using the same tables as 'evaluate' so the scores are
+    exactly those the search would give. Returns an int32 array of N scores
+    """
+    import numpy as np
+    by_code, by_plane = batch_tables()
+    boards = np.asarray(boards)
+    if boards.ndim == 2 and boards.shape[1] == 64:
+        return by_code[boards, np.arange(64)].sum(axis=1, dtype=np.int32)
+    if boards.ndim == 3 and boards.shape[1:] == (len(PLANE_PIECES), 64):
+        return np.einsum("npk,pk->n", boards.astype(np.int32), by_plane)
+    raise ValueError(f"expected boards of shape (N, 64) or (N, 12, 64), not {boards.shape}")
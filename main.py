@@ -1,8 +1,15 @@
 import pygame
+import os
 import sys
 from settings import *
-from engine import Engine
+from engine import Engine, CHECK, CHECKMATE, STALEMATE
 from ai import AI
+from pieces import EMPTY
+from moves import move_start, move_end, move_captured
+from sprites import SpriteCache
+from render import Renderer
+from book import OpeningBook
+from search_worker import SearchWorker
 
 class Game:
     def __init__(self):
@@ -11,8 +18,14 @@ class Game:
         pygame.display.set_caption("Chess by Abu")
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("Algerian", 45)
+        self.sprites = SpriteCache()  # piece images are only loaded here, the engine itself never needs them
+        self.board_colours = ["beige", "bisque4"]
+        self.renderer = Renderer(self.window, self.sprites, self.board_colours)
         self.engine = Engine()
-        self.ai = AI("black", 4, self.engine)  # adjust as desired, set colour to None for PvP
+        # The AI plays from an opening book if one has been built, see book.py
+        book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
+        self.ai = AI("black", 4, self.engine, book=book)  # adjust as desired, set colour to None for PvP
+        self.search_worker = SearchWorker(self.ai)  # the AI thinks in the background so the window stays responsive
 
     def run(self):
         game_ended = False
@@ -20,18 +33,25 @@ class Game:
         last_square_clicked = None
 
         while not game_ended:
-            if self.engine.turn == self.ai.colour:
-                best_move = self.ai.get_best_move()
+            # The game state and legal moves are only worked out once per position, not on every frame
+            game_state = self.engine.game_state()
+            if self.engine.turn == self.ai.colour and game_state != CHECKMATE and game_state != STALEMATE:
+                self.search_worker.search(self.engine)  # carries on with the search if it is already running
+                best_move = self.search_worker.get_result()
                 if best_move:
-                    self.engine.make_move(best_move[0], best_move[1])
+                    self.engine.push(best_move)
                     self.animate_move()
+                    # Think about the reply to the player's expected move while they are thinking
+                    self.search_worker.ponder(self.engine)
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.search_worker.cancel()
                     pygame.quit()
                     sys.exit()
 
-                if event.type == pygame.MOUSEBUTTONDOWN:
+                # The player can't move while the AI is thinking
+                if event.type == pygame.MOUSEBUTTONDOWN and self.engine.turn != self.ai.colour:
                     click_count += 1
                     mouse_pos = pygame.mouse.get_pos()
                     square_clicked = (mouse_pos[1] // SQUARE_DIM, mouse_pos[0] // SQUARE_DIM)
@@ -75,99 +95,67 @@ class Game:
                 if event.type == pygame.KEYDOWN:
                     # Left arrow key will undo the previous move
                     if event.key == pygame.K_LEFT:
+                        self.search_worker.cancel()
                         self.engine.undo_move()
                         click_count = 0
                     # 'R' key resets the game
                     if event.key == pygame.K_r:
+                        self.search_worker.cancel()
                         self.engine.reset()
                         click_count = 0
 
-                self.engine.board.draw(self.window)
-                # If the king is in check show it on the board
-                if self.engine.in_check():
-                    self.reveal_check()
-                self.show_previous_move()
-                # If a piece has been selected highlight its square
-                if click_count == 1:
-                    self.highlight_selection(last_square_clicked)
-                # Draw all the pieces
-                for piece in self.engine.board.dict.values():
-                    piece.draw(self.window)
-                # If a piece has been selected show its possible moves
-                if click_count == 1:
-                    self.show_moves(last_square_clicked)
+            game_state = self.engine.game_state()  # the position may have changed while handling the events
 
-                # Show checkmate/stalemate message if required
-                if self.engine.is_checkmate():
-                    self.display_message("Checkmate!!!", "press R to reset")
-                if self.engine.is_stalemate():
-                    self.display_message("Stalemate -_-", "press R to reset")
-
-                # Display update
-                pygame.display.update()
-                self.clock.tick(FPS)
-
-    def highlight_selection(self, square: tuple[int, int]):
-        pygame.draw.rect(self.window, "khaki1", (square[1] * SQUARE_DIM, square[0] * SQUARE_DIM, SQUARE_DIM,
-                                                 SQUARE_DIM))
-
-    def show_moves(self, start_square: tuple[int, int]):
-        piece = self.engine.board.dict[start_square]
-        end_squares = self.engine.legal_moves(piece)
-        for end_square in end_squares:
-            pygame.draw.circle(self.window, "red", (end_square[1] * SQUARE_DIM + SQUARE_DIM / 2,
-                                                    end_square[0] * SQUARE_DIM + SQUARE_DIM / 2), SQUARE_DIM / 8)
+            # Called every frame, whether or not there were any events, so the window keeps updating while the AI
+            # thinks, but only the squares that changed are redrawn
+            self.draw_frame(game_state, last_square_clicked if click_count == 1 else None)
+            self.clock.tick(FPS)
 
-    def show_previous_move(self):
+    def draw_frame(self, game_state: str, selected_square: tuple[int, int] | None):
+        highlights = {}
+        # If the king is in check show it on the board
+        if game_state == CHECK or game_state == CHECKMATE:
+            highlights[board_position(self.engine.king_square(self.engine.side))] = "red"
         if len(self.engine.move_log) > 0:
             last_move = self.engine.move_log[-1]
-            sq1 = last_move.start_square
-            sq2 = last_move.end_square
-            pygame.draw.rect(self.window, "khaki", (sq1[1] * SQUARE_DIM, sq1[0] * SQUARE_DIM, SQUARE_DIM, SQUARE_DIM))
-            pygame.draw.rect(self.window, "khaki1", (sq2[1] * SQUARE_DIM, sq2[0] * SQUARE_DIM, SQUARE_DIM, SQUARE_DIM))
-
-    def reveal_check(self):
-        king = next(piece for piece in self.engine.board.dict.values() if piece.name == "King" and
-                    piece.colour == self.engine.turn)
-        pygame.draw.rect(self.window, "red", (king.pos[1] * SQUARE_DIM, king.pos[0] * SQUARE_DIM,
-                                              SQUARE_DIM, SQUARE_DIM))
+            highlights[board_position(move_start(last_move))] = "khaki"
+            highlights[board_position(move_end(last_move))] = "khaki1"
+        # If a piece has been selected highlight its square and show its possible moves
+        dots = ()
+        if selected_square is not None:
+            highlights[selected_square] = "khaki1"
+            dots = self.engine.legal_moves(self.engine.board.dict[selected_square])
+        self.renderer.draw_squares(self.engine.board.squares, highlights, dots)
+
+        # Show checkmate/stalemate message if required
+        if game_state == CHECKMATE:
+            self.renderer.draw_message(self.font, "Checkmate!!!", "press R to reset")
+        elif game_state == STALEMATE:
+            self.renderer.draw_message(self.font, "Stalemate -_-", "press R to reset")
+        else:
+            self.renderer.clear_message()
+        self.renderer.flush()
 
     def animate_move(self):
         last_move = self.engine.move_log[-1]
-        piece_moved = self.engine.board.dict[last_move.end_square]
-        start_row, start_col = last_move.start_square
-        end_row, end_col = last_move.end_square
+        start_row, start_col = board_position(move_start(last_move))
+        end_row, end_col = board_position(move_end(last_move))
+        piece_moved = self.engine.board.squares[move_end(last_move)]
+        # The captured piece stays on its square until the moving piece has reached it
+        piece_captured = move_captured(last_move)
+        extra_pieces = {(end_row, end_col): piece_captured} if piece_captured != EMPTY else None
         dR = end_row - start_row
         dC = end_col - start_col
 
         frames_per_square = 2
         frame_count = (abs(dR) + abs(dC)) * frames_per_square
         for frame in range(frame_count + 1):
-            self.engine.board.draw(self.window)
-            for piece in self.engine.board.dict.values():
-                piece.draw(self.window)
-            if last_move.piece_captured is not None:
-                last_move.piece_captured.draw(self.window)
-            piece_moved.move(((start_row + dR * frame / frame_count), (start_col + dC * frame / frame_count)))
-            piece_moved.draw(self.window)
-
-            pygame.display.update()
+            self.renderer.draw_squares(self.engine.board.squares, hidden=(end_row, end_col),
+                                       extra_pieces=extra_pieces)
+            self.renderer.draw_floating_piece(piece_moved, (start_row + dR * frame / frame_count,
+                                                            start_col + dC * frame / frame_count))
+            self.renderer.flush()
             self.clock.tick(FPS)
 
-        piece_moved.pos = (end_row, end_col)  # to eliminate any dict key errors
-        pygame.display.update()
         self.clock.tick(FPS)
 
-    def display_message(self, message1: str, message2: str | None = None):
-        text1 = self.font.render(message1, True, "green")
-        text1_rect = text1.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 40))
-        self.window.blit(text1, text1_rect)
-        if message2:
-            text2 = self.font.render(message2, True, "green")
-            text2_rect = text2.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 + 10))
-            self.window.blit(text2, text2_rect)
-
-
-if __name__ == "__main__":
-    game = Game()
-    game.run()
@@ -0,0 +1,35 @@
+from settings import square_name
+
+# Moves are packed into a single int: the start and end squares (0x88 indices) in bits 0-6 and 7-13, the code of
+# the captured piece in bits 14-17 and flags above that. A move is 0 nowhere, so 0 can stand for no move
+END_SHIFT = 7
+CAPTURE_SHIFT = 14
+SQUARE_MASK = 0x7F
+SQUARES_MASK = 0x3FFF  # the start and end squares, which are enough to tell the moves of one position apart
+PIECE_MASK = 0xF
+PROMOTION = 1 << 18
+CASTLE = 1 << 19
+NO_MOVE = 0
+TACTICAL = PIECE_MASK << CAPTURE_SHIFT | PROMOTION  # set for captures and promotions, clear for quiet moves
+
+
+def encode_move(start: int, end: int, captured: int = 0, flags: int = 0) -> int:
+    return start | end << END_SHIFT | captured << CAPTURE_SHIFT | flags
+
+
+def move_start(move: int) -> int:
+    return move & SQUARE_MASK
+
+
+def move_end(move: int) -> int:
+    return move >> END_SHIFT & SQUARE_MASK
+
+
+def move_captured(move: int) -> int:
+    """Code of the piece the move captures, EMPTY (0) if it isn't a capture"""
+    return move >> CAPTURE_SHIFT & PIECE_MASK
+
+
+def move_name(move: int) -> str:
+    """Coordinate notation of a move, e.g. 'e2e4'"""
+    return square_name(move & SQUARE_MASK) + square_name(move >> END_SHIFT & SQUARE_MASK)
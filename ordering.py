@@ -0,0 +1,80 @@
+from pieces import *
+from evaluation import MATERIAL_VALUES
+from moves import *
+
+MAX_PLY = 128
+
+# Score bands, so that each kind of move is always searched before the kinds below it
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000  # plus the MVV-LVA score
+PROMOTION_SCORE = 90000
+KILLER_SCORES = (80000, 79000)
+HISTORY_LIMIT = 50000  # history scores are halved when one reaches this, keeping them below the killers
+
+
+class MoveOrderer:
+    """Orders moves for the search with a single scoring pass: the best move from the transposition table, then
+    captures by most valuable victim / least valuable attacker, then the killer moves of the ply (quiet moves that
+    caused a beta cutoff in a sibling position), then the other quiet moves by their history score (how often they
+    have caused cutoffs anywhere in the tree).
+
+    The killer and history tables are kept for the whole search, so each iterative deepening pass benefits from
+    what the previous ones learnt
+    """
+
+    def __init__(self):
+        self.killers: list[list[int]] = [[NO_MOVE, NO_MOVE] for _ in range(MAX_PLY)]
+        # Indexed by colour >> 3, then the start and end squares of the move (start square + end square * 128)
+        self.history = [[0] * (128 * 128), [0] * (128 * 128)]
+
+    def new_search(self):
+        # Killers are specific to the plies of the previous search, but history stays useful after halving it
+        for killers in self.killers:
+            killers[0] = killers[1] = NO_MOVE
+        self.age_history()
+
+    def age_history(self):
+        for table in self.history:
+            for index, score in enumerate(table):
+                if score:
+                    table[index] = score >> 1
+
+    def order(self, squares: list[int], moves: list[int], side: int, tt_move: int | None, ply: int) -> list[int]:
+        killer_1, killer_2 = self.killers[ply]
+        history = self.history[side >> 3]
+
+        def score(move: int) -> int:
+            if move == tt_move:
+                return HASH_MOVE_SCORE
+            captured = move >> CAPTURE_SHIFT & TYPE_MASK
+            if captured:
+                return CAPTURE_SCORE + 10 * MATERIAL_VALUES[captured] - \
+                    MATERIAL_VALUES[squares[move & SQUARE_MASK] & TYPE_MASK] + \
+                    (MATERIAL_VALUES[QUEEN] if move & PROMOTION else 0)
+            if move & PROMOTION:
+                return PROMOTION_SCORE
+            if move == killer_1:
+                return KILLER_SCORES[0]
+            if move == killer_2:
+                return KILLER_SCORES[1]
+            return history[move & SQUARES_MASK]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def order_captures(self, squares: list[int], moves: list[int]) -> list[int]:
+        """Orders captures by most valuable victim / least valuable attacker only, for the quiescence search"""
+        return sorted(moves, key=lambda move: 10 * MATERIAL_VALUES[move >> CAPTURE_SHIFT & TYPE_MASK] -
+                      MATERIAL_VALUES[squares[move & SQUARE_MASK] & TYPE_MASK], reverse=True)
+
+    def record_cutoff(self, move: int, side: int, depth: int, ply: int):
+        """Remembers a quiet move that caused a beta cutoff, as a killer for this ply and in the history table"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        history = self.history[side >> 3]
+        index = move & SQUARES_MASK
+        history[index] += depth * depth  # cutoffs far from the leaves prune more so count for more
+        if history[index] >= HISTORY_LIMIT:
+            self.age_history()
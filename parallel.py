@@ -0,0 +1,138 @@
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from ai import AI, SearchAborted, INFINITY, score_to_table
+from engine import Engine
+from transposition import EXACT
+
+worker_ai: AI | None = None  # each worker process keeps one AI, and with it its transposition table, for its life
+_worker_search_id = -1  # the root search the worker's AI last searched a move of
+
+
+def init_worker_ai(ai_kwargs: dict, stop_event=None):
+    """Process pool initializer that makes the worker's AI from the keyword arguments of AI, with 'depth' among
+    them if the worker searches to a depth of its own. The AI also stops when the shared 'stop_event' is set
+    """
+    global worker_ai
+    ai_kwargs = dict(ai_kwargs)
+    worker_ai = AI(None, ai_kwargs.pop("depth", 0), None, **ai_kwargs)
+    worker_ai.stop_event = stop_event
+
+
+def _search_root_move(search_id: int, position: Engine, move: int, depth: int, alpha: int, beta: int,
+                      deadline: float | None, node_limit: int | None) -> tuple[int, int] | None:
+    """Runs in a worker process: searches the position after one root move and returns its score from the root
+    side's point of view along with the number of nodes searched, or None if the search was stopped. The first task
+    of a new root search ages the worker's transposition table and move ordering, as the AI does for its own searches
+    """
+    global _worker_search_id
+    ai = worker_ai
+    if search_id != _worker_search_id:
+        _worker_search_id = search_id
+        ai.transposition_table.new_search()
+        ai.move_orderer.new_search()
+    ai.engine = position
+    ai.nodes = 0
+    ai.quiescence_nodes = 0
+    # Deadlines are passed as wall clock times since the performance counters of two processes can't be compared
+    ai.deadline = time.perf_counter() + (deadline - time.time()) if deadline is not None else None
+    ai.max_nodes = node_limit
+    turn_multiplier = 1 if position.turn == "white" else -1
+    ai.root_piece_count = position.piece_count
+
+    position.push(move)
+    try:
+        score, _ = ai.negamax(depth - 1, -beta, -alpha, -turn_multiplier, 1)
+    except SearchAborted:
+        return None
+    return -score, ai.nodes
+
+
+class ParallelAI(AI):
+    """Splits the root moves of each iterative deepening pass over a pool of worker processes.
+
+    The best move from the previous pass is searched here first to get a score for the others to beat, then the
+    remaining root moves are sent to the workers, each of which searches its own copy of the engine (the board and
+    move log are changed in place while searching, so they can't be shared). With 'workers' set to 1 this is the
+    same as the plain AI and just as deterministic.
+
+    A node limit applies to each root move a worker searches rather than to the search as a whole. The pool is
+    started on the first parallel search and should be shut down with 'close'
+    """
+
+    def __init__(self, colour: str, depth: int, engine, workers: int | None = None, **kwargs):
+        super().__init__(colour, depth, engine, **kwargs)
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_size_mb = kwargs.get("hash_size_mb", 16)
+        self.executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self.worker_stop_event = None
+        self.search_id = 0  # counts the root searches, so the workers know when a new one starts
+
+    def start_workers(self):
+        context = multiprocessing.get_context()
+        self.worker_stop_event = context.Event()
+        ai_kwargs = {"hash_size_mb": self.hash_size_mb, "quiescence_depth": self.quiescence_depth,
+                     "null_move": self.null_move, "late_move_reductions": self.late_move_reductions,
+                     "futility_pruning": self.futility_pruning, "use_bitbases": self.bitbases is not None}
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=context, initializer=init_worker_ai, initargs=(ai_kwargs, self.worker_stop_event))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def iterative_deepening(self, depth: int | None, time_limit: float | None,
+                            node_limit: int | None) -> int | None:
+        self.search_id += 1
+        return super().iterative_deepening(depth, time_limit, node_limit)
+
+    def aspiration_search(self, depth: int, turn_multiplier: int) -> tuple[int, int | None]:
+        # Shallow passes are over too quickly to be worth sending to other processes
+        if self.workers == 1 or depth <= 2:
+            return super().aspiration_search(depth, turn_multiplier)
+        if self.executor is None:
+            self.start_workers()
+
+        entry = self.transposition_table.probe(self.engine.hash)
+        moves = self.move_orderer.order(self.engine.board.squares, self.legal_moves(), self.engine.side,
+                                        entry[3] if entry is not None else None, 0)
+        if len(moves) == 0:
+            return super().aspiration_search(depth, turn_multiplier)
+
+        best_move = moves[0]
+        self.engine.push(best_move)
+        best_score = -self.negamax(depth - 1, -INFINITY, INFINITY, -turn_multiplier, 1)[0]
+        self.engine.undo_move()
+
+        # Moves that can't beat the first one fail low in the workers, while the score of any move that does is
+        # exact since there is no upper bound at the root
+        deadline = time.time() + (self.deadline - time.perf_counter()) if self.deadline is not None else None
+        position = self.engine.copy()
+        futures = [self.executor.submit(_search_root_move, self.search_id, position, move, depth, best_score, INFINITY,
+                                        deadline, self.max_nodes) for move in moves[1:]]
+        self.wait_for_workers(futures)
+
+        for move, future in zip(moves[1:], futures):
+            result = future.result()
+            if result is None:
+                raise SearchAborted
+            score, nodes = result
+            self.nodes += nodes
+            if score > best_score:  # ties keep the earlier move so the result doesn't depend on timing
+                best_score, best_move = score, move
+
+        self.transposition_table.store(self.engine.hash, depth, score_to_table(best_score, 0), EXACT, best_move)
+        return best_score, best_move
+
+    def wait_for_workers(self, futures: list[concurrent.futures.Future]):
+        """Waits for the workers while watching for a stop request, which is passed on to them"""
+        pending = set(futures)
+        while pending:
+            _, pending = concurrent.futures.wait(pending, timeout=0.01)
+            if pending and (self.stop_requested or self.out_of_budget()):
+                self.worker_stop_event.set()
+                concurrent.futures.wait(pending)
+                self.worker_stop_event.clear()
+                raise SearchAborted
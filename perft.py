@@ -0,0 +1,104 @@
+import argparse
+import time
+from engine import Engine, move_name
+
+# Test positions, given as the moves that reach them from the start or as a FEN, with the number of leaf nodes at
+# depth 1, 2, ... The counts are for this engine's rules, which have no en passant and only promote to a queen. Up to
+# depth 4 from the start position they match the standard published counts, and at depth 5 they are the standard
+# 4,865,609 less the 258 en passant captures. The FEN positions are the standard perft test positions
+POSITIONS = {
+    "start": ("", [20, 400, 8902, 197281, 4865351]),
+    "italian": ("e2e4 e7e5 g1f3 b8c6 f1c4 f8c5", [33, 1150, 37139, 1272509]),
+    "queens-gambit": ("d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7", [38, 1195, 44784, 1454706]),
+    "castled": ("e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 e1g1 f8c5 d2d3 e8g8", [35, 1119, 38394, 1232667]),
+    "scholars-mate": ("e2e4 e7e5 d1h5 b8c6 f1c4 g8f6", [43, 1133, 45695, 1290382]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2038, 97766, 4068217]),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2810, 43087, 671300]),
+    "promotions": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 228, 8083, 320639]),
+    "middlegame": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [41, 1373, 54007, 1806790]),
+}
+
+
+def perft(engine: Engine, depth: int) -> int:
+    """Counts the leaf nodes of the legal move tree to the given depth"""
+    moves = engine.get_legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1  # the last ply's moves are counted without being made
+
+    nodes = 0
+    for move in moves:
+        engine.push(move)
+        nodes += perft(engine, depth - 1)
+        engine.undo_move()
+    return nodes
+
+
+def divide(engine: Engine, depth: int) -> dict[str, int]:
+    """Leaf node counts split by root move, which narrows down where two move generators disagree"""
+    counts = {}
+    for move in engine.get_legal_moves():
+        engine.push(move)
+        counts[move_name(move)] = perft(engine, depth - 1)
+        engine.undo_move()
+    return counts
+
+
+def setup_position(name: str) -> Engine:
+    setup = POSITIONS[name][0]
+    if "/" in setup:
+        return Engine.from_fen(setup)
+    engine = Engine()
+    for text in setup.split():
+        engine.push(engine.parse_move(text))
+    return engine
+
+
+def run(name: str, depth: int, show_divide: bool = False) -> bool:
+    """Runs perft on a test position, printing the node count, speed and whether it matches the expected count.
+    Returns False if the count is wrong
+    """
+    engine = setup_position(name)
+    start_time = time.perf_counter()
+    if show_divide:
+        counts = divide(engine, depth)
+        for move, count in sorted(counts.items()):
+            print(f"  {move}: {count}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(engine, depth)
+    elapsed = time.perf_counter() - start_time
+
+    expected_counts = POSITIONS[name][1]
+    if depth <= len(expected_counts):
+        correct = nodes == expected_counts[depth - 1]
+        result = "ok" if correct else f"WRONG, expected {expected_counts[depth - 1]}"
+    else:
+        correct = True
+        result = "no expected count"
+    nodes_per_second = nodes / elapsed if elapsed > 0 else 0
+    print(f"{name} depth {depth}: {nodes} nodes in {elapsed:.2f}s ({nodes_per_second:,.0f} nodes/s) {result}")
+    return correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the leaf nodes of the move tree to measure the speed and "
+                                                 "check the correctness of the move generator")
+    parser.add_argument("depth", type=int, nargs="?", default=4)
+    parser.add_argument("--position", choices=POSITIONS, default="start")
+    parser.add_argument("--divide", action="store_true", help="show the node count of each root move")
+    parser.add_argument("--suite", action="store_true",
+                        help="run every test position at every depth up to the given depth")
+    args = parser.parse_args()
+
+    if args.suite:
+        correct = True
+        for name, (_, expected_counts) in POSITIONS.items():
+            for depth in range(1, min(args.depth, len(expected_counts)) + 1):
+                correct = run(name, depth) and correct
+    else:
+        correct = run(args.position, args.depth, args.divide)
+    raise SystemExit(0 if correct else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import re
+from collections.abc import Iterator
+from typing import TextIO
+from engine import Engine
+from pieces import *
+from moves import *
+
+HEADER = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# Comments, variation brackets, annotation glyphs and everything else (move numbers, moves and results)
+TOKEN = re.compile(r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|[^\s(){};]+")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+SAN_PIECES = {"N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+SAN_LETTERS = {piece_type: letter for letter, piece_type in SAN_PIECES.items()}
+
+
+def read_games(file: TextIO) -> Iterator[tuple[dict[str, str], list[str]]]:
+    """Reads the games of a PGN file one at a time, as their headers and the moves of the main line in SAN.
+    Comments, variations and annotation glyphs are dropped
+    """
+    headers = {}
+    movetext = []
+    for line in file:
+        line = line.strip()
+        if line.startswith("[") and line.endswith("]"):
+            if movetext:
+                yield headers, parse_movetext("\n".join(movetext))
+                headers, movetext = {}, []
+            match = HEADER.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith("%"):  # lines starting with % are escaped and ignored
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, parse_movetext("\n".join(movetext))
+
+
+def parse_movetext(text: str) -> list[str]:
+    moves = []
+    variation_depth = 0
+    for match in TOKEN.finditer(text):
+        token = match.group()
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth -= 1
+        elif variation_depth == 0 and token[0] not in "{;$":
+            token = MOVE_NUMBER.sub("", token)  # the number may be written against the move, e.g. '1.e4'
+            if token and token not in RESULTS:
+                moves.append(token)
+    return moves
+
+
+def parse_san(engine: Engine, san: str) -> int:
+    """Finds the legal move written in standard algebraic notation, e.g. 'Nbd7', 'exd5', 'O-O' or 'e8=Q+'.
+    Raises ValueError if there is no such move, including promotions to anything but a queen
+    """
+    text = san.rstrip("+#!?")
+    legal_moves = engine.get_legal_moves()
+    squares = engine.board.squares
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        king = engine.king_squares[engine.side]
+        move = engine.encode_move(king, king + 2 if len(text) == 3 else king - 2)
+        if move not in legal_moves:
+            raise ValueError(f"illegal move: {san}")
+        return move
+
+    promotion = None
+    if "=" in text:
+        text, promotion = text.split("=", 1)
+    elif len(text) > 2 and text[-1] in SAN_PIECES:
+        text, promotion = text[:-1], text[-1]
+    if promotion is not None and promotion != "Q":
+        raise ValueError(f"only promotion to a queen is supported: {san}")
+
+    if len(text) < 2 or text[-2] not in "abcdefgh" or text[-1] not in "12345678":
+        raise ValueError(f"can't read move: {san}")
+    end = parse_square(text[-2:])
+    if text[0] in SAN_PIECES:
+        piece_type = SAN_PIECES[text[0]]
+        qualifier = text[1:-2]
+    else:
+        piece_type = PAWN
+        qualifier = text[:-2]
+    qualifier = qualifier.replace("x", "")
+
+    candidates = []
+    for move in legal_moves:
+        start = move & SQUARE_MASK
+        if move >> END_SHIFT & SQUARE_MASK != end or squares[start] & TYPE_MASK != piece_type:
+            continue
+        if any((char in "abcdefgh" and start & 7 != "abcdefgh".index(char)) or
+               (char in "12345678" and start >> 4 != BOARD_DIM - int(char)) for char in qualifier):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'ambiguous' if candidates else 'illegal'} move: {san}")
+    return candidates[0]
+
+
+def san(engine: Engine, move: int) -> str:
+    """Standard algebraic notation of a legal move in the engine's current position"""
+    start = move & SQUARE_MASK
+    end = move >> END_SHIFT & SQUARE_MASK
+    squares = engine.board.squares
+    piece_type = squares[start] & TYPE_MASK
+    if piece_type == KING and abs(end - start) == 2:
+        text = "O-O" if end > start else "O-O-O"
+    else:
+        capture = squares[end] != EMPTY
+        if piece_type == PAWN:
+            text = (square_name(start)[0] + "x" if capture else "") + square_name(end)
+            if end < 16 or end >= 112:
+                text += "=Q"
+        else:
+            # Add the file, rank or whole square of the start if another piece of the same type can move there
+            others = [other & SQUARE_MASK for other in engine.get_legal_moves()
+                      if other >> END_SHIFT & SQUARE_MASK == end and other & SQUARE_MASK != start and
+                      squares[other & SQUARE_MASK] == squares[start]]
+            qualifier = ""
+            if others:
+                if all(other & 7 != start & 7 for other in others):
+                    qualifier = square_name(start)[0]
+                elif all(other >> 4 != start >> 4 for other in others):
+                    qualifier = square_name(start)[1]
+                else:
+                    qualifier = square_name(start)
+            text = SAN_LETTERS[piece_type] + qualifier + ("x" if capture else "") + square_name(end)
+
+    engine.push(move)
+    if engine.in_check():
+        text += "#" if len(engine.get_legal_moves()) == 0 else "+"
+    engine.undo_move()
+    return text
@@ -1,166 +1,154 @@
 from settings import *
-import pygame
+from tables import *
+
+# Pieces are stored on the board as small integer codes: the low 3 bits hold the piece type and bit 3 the colour
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+TYPE_MASK = 7
+WHITE = 0
+BLACK = 8
+
+COLOUR_NAMES = {WHITE: "white", BLACK: "black"}
+COLOUR_CODES = {"white": WHITE, "black": BLACK}
 
 
 class Piece:
+    """Lightweight view of a piece code on the board, created on demand for the GUI. The engine itself only ever
+    works with the codes in 'board.squares'
+    """
+    name = ""
+    type = EMPTY
+    value = 0
+
     def __init__(self, colour: str, pos: BoardPosition, board):
         self.colour = colour  # black or white
         self.pos = pos  # position on board array
-        self.image = pygame.image.load("images/whitePawn.png")
-        self.rect = self.image.get_rect(topleft=(self.pos[1] * SQUARE_DIM, self.pos[0] * SQUARE_DIM))
         self.board = board  # board object
 
-    def draw(self, window: pygame.Surface):
-        window.blit(self.image, (self.rect.x, self.rect.y))
+    @property
+    def code(self) -> int:
+        return COLOUR_CODES[self.colour] | self.type
 
     def move(self, new_pos: BoardPosition):
         # sets the new coordinates
         self.pos = new_pos
-        self.rect.topleft = (self.pos[1] * SQUARE_DIM, self.pos[0] * SQUARE_DIM)
 
     def get_possible_moves(self) -> list[BoardPosition]:
         """ To be implemented by inheriting pieces """
 
+    def is_enemy(self, code: int) -> bool:
+        return code != EMPTY and code & BLACK != COLOUR_CODES[self.colour]
+
+
+class SteppingPiece(Piece):
+    """Parent class for the Knight and King which move a single step in each of their directions"""
+    targets: list[tuple[int, ...]] = []  # squares one step away from each square, see tables.py
+
+    def get_possible_moves(self) -> list[BoardPosition]:
+        squares = self.board.squares
+        return [board_position(target_square) for target_square in self.targets[square_index(self.pos)]
+                if squares[target_square] == EMPTY or self.is_enemy(squares[target_square])]
+
 
 class SlidingPiece(Piece):
     """Parent class which the Rook, Bishop and Queen will inherit from since
     they have identical movement logic just with different movement directions
 
-    The 'move_directions' attribute is not defined for this class but will be
+    The 'rays' attribute is not defined for this class but will be
     for the classes that inherit from it
     """
-
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.move_directions: list[tuple[int, int]] = []
+    rays: list[tuple[tuple[int, ...], ...]] = []  # rays in the piece's directions from each square, see tables.py
 
     def get_possible_moves(self) -> list[BoardPosition]:
         legal_moves = []
-        for direction in self.move_directions:
-            for i in range(1, BOARD_DIM):
-                target_square = BoardPosition(self.pos[0] + direction[0] * i, self.pos[1] + direction[1] * i)
-                if (target_square[0] < 0 or target_square[0] >= BOARD_DIM or
-                        target_square[1] < 0 or target_square[1] >= BOARD_DIM):
-                    break
-                if target_square not in self.board.dict:
-                    legal_moves.append(target_square)
-                elif self.board.dict[target_square].colour != self.colour:
-                    legal_moves.append(target_square)
-                    break
+        squares = self.board.squares
+        for ray in self.rays[square_index(self.pos)]:
+            for target_square in ray:
+                if squares[target_square] == EMPTY:
+                    legal_moves.append(board_position(target_square))
                 else:
+                    if self.is_enemy(squares[target_square]):
+                        legal_moves.append(board_position(target_square))
                     break
 
         return legal_moves
 
 
 class Pawn(Piece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "Pawn"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 10
+    name = "Pawn"
+    type = PAWN
+    value = 10
 
     def get_possible_moves(self) -> list[BoardPosition]:
         possible_moves = []
+        squares = self.board.squares
+        start = square_index(self.pos)
         start_row = 6
-        move_direction = -1
+        move_direction = -16
         if self.colour == "black":
             start_row = 1
-            move_direction = 1
-
-        blocked = False  # True or false depending on whether the pawn can move forward
-        # Can move 1 square forward if not occupied
-        target_square = BoardPosition(self.pos[0] + move_direction, self.pos[1])
-        if target_square not in self.board.dict:
-            possible_moves.append(target_square)
-        else:
-            blocked = True
-
-        # Can move 2 squares forward if still on start square and if target square and the one behind are not occupied
-        if not blocked:
-            target_square = BoardPosition(self.pos[0] + 2 * move_direction, self.pos[1])
-            if self.pos[0] == start_row and target_square not in self.board.dict:
-                possible_moves.append(target_square)
+            move_direction = 16
+
+        # Can move 1 square forward if not occupied, and 2 squares if still on its start square
+        target_square = start + move_direction
+        if not target_square & OFF_BOARD and squares[target_square] == EMPTY:
+            possible_moves.append(board_position(target_square))
+            target_square += move_direction
+            if self.pos[0] == start_row and squares[target_square] == EMPTY:
+                possible_moves.append(board_position(target_square))
 
         # Can capture diagonally 1 square
-        for capture_direction in [(move_direction, 1), (move_direction, -1)]:
-            target_square = BoardPosition(self.pos[0] + capture_direction[0], self.pos[1] + capture_direction[1])
-            if target_square in self.board.dict:
-                piece = self.board.dict[target_square]
-                if piece.colour != self.colour:
-                    possible_moves.append(target_square)
+        for target_square in PAWN_ATTACKS[COLOUR_CODES[self.colour] >> 3][start]:
+            if self.is_enemy(squares[target_square]):
+                possible_moves.append(board_position(target_square))
 
         return possible_moves
 
 
-class Knight(Piece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "Knight"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 30
-
-    def get_possible_moves(self) -> list[BoardPosition]:
-        possible_moves = []
-        move_directions = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
-        for direction in move_directions:
-            target_square = BoardPosition(self.pos[0] + direction[0], self.pos[1] + direction[1])
-            if 0 <= target_square[0] < BOARD_DIM and 0 <= target_square[1] < BOARD_DIM:
-                if target_square not in self.board.dict:
-                    possible_moves.append(target_square)
-                elif self.board.dict[target_square].colour != self.colour:
-                    possible_moves.append(target_square)
-
-        return possible_moves
+class Knight(SteppingPiece):
+    name = "Knight"
+    type = KNIGHT
+    value = 30
+    targets = KNIGHT_TARGETS
 
 
 class Rook(SlidingPiece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "Rook"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 50
-        self.move_directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-        self.can_castle = True
+    name = "Rook"
+    type = ROOK
+    value = 50
+    rays = ROOK_RAYS
 
 
 class Bishop(SlidingPiece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "Bishop"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 50
-        self.move_directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+    name = "Bishop"
+    type = BISHOP
+    value = 50
+    rays = BISHOP_RAYS
 
 
 class Queen(SlidingPiece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "Queen"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 90
-        self.move_directions = [(1, 1), (1, -1), (-1, 1), (-1, -1),
-                                (1, 0), (-1, 0), (0, 1), (0, -1)]
+    name = "Queen"
+    type = QUEEN
+    value = 90
+    rays = QUEEN_RAYS
 
 
-class King(Piece):
-    def __init__(self, colour: str, pos: BoardPosition, board):
-        super().__init__(colour, pos, board)
-        self.name = "King"
-        self.image = pygame.image.load("images/" + self.colour + self.name + ".png")
-        self.value = 0
-        self.can_castle = True
+class King(SteppingPiece):
+    name = "King"
+    type = KING
+    value = 0
+    targets = KING_TARGETS
 
-    def get_possible_moves(self) -> list[BoardPosition]:
-        possible_moves = []
-        move_directions = [(1, 0), (1, 1), (1, -1), (-1, 0),
-                           (-1, 1), (-1, -1), (0, 1), (0, -1)]
-        for direction in move_directions:
-            target_square = (self.pos[0] + direction[0], self.pos[1] + direction[1])
-            if 0 <= target_square[0] < BOARD_DIM and 0 <= target_square[1] < BOARD_DIM:
-                if target_square not in self.board.dict:
-                    possible_moves.append(BoardPosition(*target_square))
-                elif self.board.dict[target_square].colour != self.colour:
-                    possible_moves.append(BoardPosition(*target_square))
 
-        return possible_moves
+# Indexed by piece type
+PIECE_CLASSES = [None, Pawn, Knight, Bishop, Rook, Queen, King]
+PIECE_VALUES = [0] + [piece_class.value for piece_class in PIECE_CLASSES[1:]]
+
+
+def make_piece(code: int, pos: BoardPosition, board) -> Piece:
+    return PIECE_CLASSES[code & TYPE_MASK](COLOUR_NAMES[code & BLACK], pos, board)
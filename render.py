@@ -0,0 +1,127 @@
+import pygame
+from settings import *
+from pieces import EMPTY, TYPE_MASK, BLACK, COLOUR_NAMES, PIECE_CLASSES
+from sprites import SpriteCache
+
+
+class Renderer:
+    """Draws the board to the window, only redrawing and updating the squares whose contents changed since the
+    last frame. Each square is described by its piece code, highlight colour and whether it shows a move dot, and
+    the checkerboard itself is drawn once to a surface that squares are restored from.
+
+    A frame is drawn with 'draw_squares', then optionally 'draw_floating_piece' and 'draw_message', and shown with
+    'flush'
+    """
+
+    def __init__(self, window: pygame.Surface, sprites: SpriteCache, board_colours: list[str]):
+        self.window = window
+        self.sprites = sprites
+        self.board_surface = pygame.Surface(window.get_size()).convert()
+        for row in range(BOARD_DIM):
+            for col in range(BOARD_DIM):
+                pygame.draw.rect(self.board_surface, board_colours[(row + col) % 2], square_rect((row, col)))
+
+        self.shown: dict[tuple[int, int], tuple[int, str | None, bool]] = {}  # what each square showed last frame
+        self.covered: list[pygame.Rect] = []  # drawn over the squares last frame, e.g. an animated piece
+        self.dirty_rects: list[pygame.Rect] = []
+        self.message: tuple[str, str | None] | None = None
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Redraws the whole window next frame, e.g. after something else drew to it"""
+        self.full_redraw = True
+
+    def draw_squares(self, squares: list[int], highlights: dict[tuple[int, int], str] | None = None,
+                     dots=(), hidden: tuple[int, int] | None = None,
+                     extra_pieces: dict[tuple[int, int], int] | None = None):
+        """Redraws the squares that changed. 'squares' is the engine's 0x88 board, 'highlights' maps positions to
+        the colour to fill them with and 'dots' are the positions to mark as possible moves. The piece on the
+        'hidden' square is left out and 'extra_pieces' are drawn in place of the board's, both for animations
+        """
+        highlights = highlights or {}
+        extra_pieces = extra_pieces or {}
+        dots = set(dots)
+        dirty = set()
+        for rect in self.covered:
+            dirty.update(squares_under(rect))
+        self.dirty_rects += self.covered
+        self.covered = []
+
+        for row in range(BOARD_DIM):
+            for col in range(BOARD_DIM):
+                pos = (row, col)
+                code = extra_pieces.get(pos, EMPTY if pos == hidden else squares[row * 16 + col])
+                contents = (code, highlights.get(pos), pos in dots)
+                if self.full_redraw or self.shown.get(pos) != contents or pos in dirty:
+                    self.shown[pos] = contents
+                    self.draw_square(pos, *contents)
+                    self.dirty_rects.append(square_rect(pos))
+
+        if self.full_redraw:
+            self.dirty_rects = [self.window.get_rect()]
+            self.full_redraw = False
+
+    def draw_square(self, pos: tuple[int, int], code: int, highlight: str | None, dot: bool):
+        rect = square_rect(pos)
+        if highlight is None:
+            self.window.blit(self.board_surface, rect, rect)
+        else:
+            pygame.draw.rect(self.window, highlight, rect)
+        if code != EMPTY:
+            self.window.blit(self.sprite(code), rect)
+        if dot:
+            pygame.draw.circle(self.window, "red", rect.center, SQUARE_DIM / 8)
+
+    def draw_floating_piece(self, code: int, pos: tuple[float, float]):
+        """Draws a piece at a fractional board position, e.g. part-way through an animation. The squares under it
+        are restored next frame
+        """
+        rect = self.window.blit(self.sprite(code), (pos[1] * SQUARE_DIM, pos[0] * SQUARE_DIM))
+        self.covered.append(rect)
+        self.dirty_rects.append(rect)
+
+    def draw_message(self, font: pygame.font.Font, message1: str, message2: str | None = None):
+        """Draws text over the middle of the board. It is redrawn when the squares under it change"""
+        texts = [(message1, WINDOW_HEIGHT // 2 - 40)] + ([(message2, WINDOW_HEIGHT // 2 + 10)] if message2 else [])
+        redraw = self.message != (message1, message2) or any(
+            rect.colliderect(self.message_area()) for rect in self.dirty_rects)
+        self.message = (message1, message2)
+        if redraw:
+            self.restore(self.message_area())  # the board under the text so anti-aliased edges don't build up
+            for text, y in texts:
+                surface = font.render(text, True, "green")
+                self.window.blit(surface, surface.get_rect(center=(WINDOW_WIDTH // 2, y)))
+            self.dirty_rects.append(self.message_area())
+
+    def clear_message(self):
+        if self.message is not None:
+            self.message = None
+            self.full_redraw = True
+
+    def message_area(self) -> pygame.Rect:
+        return pygame.Rect(0, WINDOW_HEIGHT // 2 - 80, WINDOW_WIDTH, 130)
+
+    def restore(self, rect: pygame.Rect):
+        """Redraws the squares under a rect without marking them as changed"""
+        for pos in squares_under(rect):
+            self.draw_square(pos, *self.shown[pos])
+
+    def flush(self):
+        """Updates the parts of the display that were drawn to this frame"""
+        if self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+            self.dirty_rects = []
+
+    def sprite(self, code: int) -> pygame.Surface:
+        return self.sprites.get(COLOUR_NAMES[code & BLACK], PIECE_CLASSES[code & TYPE_MASK].name)
+
+
+def square_rect(pos: tuple[int, int]) -> pygame.Rect:
+    return pygame.Rect(pos[1] * SQUARE_DIM, pos[0] * SQUARE_DIM, SQUARE_DIM, SQUARE_DIM)
+
+
+def squares_under(rect: pygame.Rect) -> list[tuple[int, int]]:
+    first_row, first_col = max(rect.top // SQUARE_DIM, 0), max(rect.left // SQUARE_DIM, 0)
+    last_row = min((rect.bottom - 1) // SQUARE_DIM, BOARD_DIM - 1)
+    last_col = min((rect.right - 1) // SQUARE_DIM, BOARD_DIM - 1)
+    return [(row, col) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
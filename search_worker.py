@@ -0,0 +1,71 @@
+import threading
+from ai import AI
+from engine import Engine
+
+
+class SearchWorker:
+    """Runs the AI's search in a background thread on a copy of the game's position, so the GUI keeps responding
+    while the AI thinks.
+
+    After the AI has moved the worker can ponder: it predicts the player's reply from the transposition table and
+    searches the position after it while the player is thinking. If the player makes that reply, the pondering
+    search just carries on as the real search; otherwise it is cancelled, though the positions it stored in the
+    transposition table still speed up the next search
+    """
+
+    def __init__(self, ai: AI):
+        self.ai = ai  # the AI searches its own copy of the position, never the game's engine
+        self.thread: threading.Thread | None = None
+        self.position_hash: int | None = None  # hash of the position being searched
+        self.pondering = False
+        self.result: int | None = None
+
+    def search(self, engine: Engine):
+        """Starts searching for the best move in the engine's position. Does nothing if that position is already
+        being searched, including when it is the position that is being pondered
+        """
+        if self.thread is not None and self.position_hash == engine.hash:
+            self.pondering = False  # the player made the predicted move
+            return
+        self.cancel()
+        self.start(engine.copy())
+
+    def ponder(self, engine: Engine):
+        """Starts searching the position after the player's expected reply, if the AI has one in mind"""
+        self.cancel()
+        entry = self.ai.transposition_table.probe(engine.hash)
+        if entry is None or entry[3] not in engine.get_legal_moves():
+            return
+
+        position = engine.copy()
+        position.push(entry[3])
+        self.start(position)
+        self.pondering = True
+
+    def start(self, position: Engine):
+        self.ai.engine = position
+        self.ai.stop_requested = False
+        self.position_hash = position.hash
+        self.pondering = False
+        self.result = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.result = self.ai.get_best_move()
+
+    def get_result(self) -> int | None:
+        """The best move once a search (not a ponder) has finished, otherwise None"""
+        if self.thread is None or self.pondering or self.thread.is_alive():
+            return None
+        self.thread = None
+        return self.result
+
+    def cancel(self):
+        """Stops the current search or ponder and waits for its thread to finish"""
+        if self.thread is not None:
+            self.ai.stop()
+            self.thread.join()
+            self.thread = None
+        self.position_hash = None
+        self.pondering = False
@@ -6,8 +6,32 @@ SQUARE_DIM = 72
 WINDOW_WIDTH = SQUARE_DIM * BOARD_DIM
 WINDOW_HEIGHT = SQUARE_DIM * BOARD_DIM
 FPS = 60
+BOOK_PATH = "book.bin"
 
 
 class BoardPosition(NamedTuple):
     row: int
     col: int
+
+
+# The engine stores the board as a 0x88 array: index = row * 16 + col. Any index with a bit of 0x88 set is off the
+# board, so stepping off an edge can be detected with a single test instead of bounds checking the row and column
+OFF_BOARD = 0x88
+SQUARES = [row * 16 + col for row in range(BOARD_DIM) for col in range(BOARD_DIM)]  # all on-board indices
+
+
+def square_index(pos: BoardPosition | tuple[int, int]) -> int:
+    return pos[0] * 16 + pos[1]
+
+
+def board_position(square: int) -> BoardPosition:
+    return BoardPosition(square >> 4, square & 7)
+
+
+def square_name(square: int) -> str:
+    """Algebraic name of a 0x88 square, e.g. 'e4'"""
+    return "abcdefgh"[square & 7] + str(BOARD_DIM - (square >> 4))
+
+
+def parse_square(name: str) -> int:
+    return (BOARD_DIM - int(name[1])) * 16 + "abcdefgh".index(name[0])
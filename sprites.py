@@ -0,0 +1,21 @@
+import pygame
+
+PIECE_COLOURS = ["white", "black"]
+PIECE_NAMES = ["Pawn", "Knight", "Bishop", "Rook", "Queen", "King"]
+
+
+class SpriteCache:
+    """Loads every piece image once so that pieces created by the engine (e.g. promotions explored by the AI)
+    never touch the disk. Images are looked up by colour and piece name, matching the file names in 'images/'
+    """
+
+    def __init__(self, directory: str = "images"):
+        self.sprites: dict[tuple[str, str], pygame.Surface] = {}
+        for colour in PIECE_COLOURS:
+            for name in PIECE_NAMES:
+                image = pygame.image.load(f"{directory}/{colour}{name}.png")
+                # convert to the display's pixel format so blitting doesn't convert it every frame
+                self.sprites[(colour, name)] = image.convert_alpha()
+
+    def get(self, colour: str, name: str) -> pygame.Surface:
+        return self.sprites[(colour, name)]
@@ -0,0 +1,85 @@
+import functools
+import json
+import time
+
+# Parts of the search that are timed, see AI.instrument and AI.legal_moves
+PHASES = ("move_generation", "move_ordering", "capture_ordering", "evaluation")
+
+
+class SearchStats:
+    """Figures about a search, collected when 'AI.get_best_move' is asked for them. Collecting them wraps the
+    timed evaluation and ordering methods for the length of the search, while move generation is timed by the
+    search itself, which only costs a check of 'AI.stats' per node when no stats are collected.
+
+    Times are wall clock seconds and include the cost of timing itself, so they are best compared with each other
+    rather than with a search that isn't collecting stats
+    """
+
+    def __init__(self):
+        self.iterations: list[dict] = []  # one entry per iterative deepening pass, including an unfinished last one
+        self.cutoffs = 0  # beta cutoffs in the main search
+        self.first_move_cutoffs = 0  # of which were caused by the first move searched
+        self.phase_times = {phase: 0.0 for phase in PHASES}
+        self.phase_calls = {phase: 0 for phase in PHASES}
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.time = 0.0
+        self.book_move = False
+
+    def record_cutoff(self, first_move: bool):
+        self.cutoffs += 1
+        if first_move:
+            self.first_move_cutoffs += 1
+
+    def record_iteration(self, depth: int, nodes: int, quiescence_nodes: int, elapsed: float, completed: bool,
+                         score: int | None = None, move: str | None = None):
+        self.iterations.append({"depth": depth, "nodes": nodes, "quiescence_nodes": quiescence_nodes,
+                                "time": elapsed, "completed": completed, "score": score, "move": move})
+
+    def record_phase(self, phase: str, elapsed: float):
+        self.phase_times[phase] += elapsed
+        self.phase_calls[phase] += 1
+
+    def timed(self, phase: str, function):
+        """Wraps a function so that its calls are counted and timed under the given phase"""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record_phase(phase, time.perf_counter() - start_time)
+        return wrapper
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """How often the move ordering put a move that refutes the position first, close to 1 is good"""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factor(self) -> float:
+        """Average growth in nodes from one completed iteration to the next"""
+        nodes = [iteration["nodes"] for iteration in self.iterations if iteration["completed"]]
+        ratios = [current / previous for previous, current in zip(nodes, nodes[1:]) if previous > 0]
+        return sum(ratios) / len(ratios) if ratios else 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.time if self.time > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {"nodes": self.nodes, "quiescence_nodes": self.quiescence_nodes, "time": self.time,
+                "nodes_per_second": self.nodes_per_second, "cutoffs": self.cutoffs,
+                "first_move_cutoff_rate": self.first_move_cutoff_rate, "branching_factor": self.branching_factor,
+                "book_move": self.book_move, "iterations": self.iterations,
+                "phases": {phase: {"time": self.phase_times[phase], "calls": self.phase_calls[phase]}
+                           for phase in PHASES}}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def __str__(self) -> str:
+        phases = ", ".join(f"{phase} {self.phase_times[phase]:.3f}s" for phase in PHASES)
+        return (f"{self.nodes} nodes ({self.quiescence_nodes} quiescence) in {self.time:.3f}s, "
+                f"{self.nodes_per_second:,.0f} nodes/s, branching factor {self.branching_factor:.2f}, first move "
+                f"cutoffs {self.first_move_cutoff_rate:.1%}, {phases}")
@@ -0,0 +1,49 @@
+from settings import SQUARES, OFF_BOARD
+
+# Offsets of each movement direction on the 0x88 board (a row is 16 squares)
+KNIGHT_DIRECTIONS = (33, 31, 18, 14, -14, -18, -31, -33)
+BISHOP_DIRECTIONS = (17, 15, -15, -17)
+ROOK_DIRECTIONS = (16, -16, 1, -1)
+QUEEN_DIRECTIONS = BISHOP_DIRECTIONS + ROOK_DIRECTIONS
+KING_DIRECTIONS = QUEEN_DIRECTIONS
+
+# Lookup tables worked out once at import time so move generation and attack detection don't step and bounds check
+# the same squares over and over. All are lists indexed by 0x88 square, with empty entries for off-board indices
+
+
+def build_targets(directions: tuple[int, ...]) -> list[tuple[int, ...]]:
+    """The on-board squares one step away from each square in the given directions"""
+    targets = [()] * 128
+    for square in SQUARES:
+        targets[square] = tuple(square + direction for direction in directions
+                                if not (square + direction) & OFF_BOARD)
+    return targets
+
+
+def build_ray(square: int, direction: int) -> tuple[int, ...]:
+    """The squares from the one next to 'square' to the edge of the board, in order"""
+    ray = []
+    square += direction
+    while not square & OFF_BOARD:
+        ray.append(square)
+        square += direction
+    return tuple(ray)
+
+
+def build_rays(directions: tuple[int, ...]) -> list[tuple[tuple[int, ...], ...]]:
+    """The rays from each square in the given directions, leaving out those that start at the edge of the board"""
+    rays = [()] * 128
+    for square in SQUARES:
+        rays[square] = tuple(ray for ray in (build_ray(square, direction) for direction in directions) if ray)
+    return rays
+
+
+KNIGHT_TARGETS = build_targets(KNIGHT_DIRECTIONS)
+KING_TARGETS = build_targets(KING_DIRECTIONS)
+# Squares attacked by a pawn, indexed by colour >> 3 then square. White pawns attack towards row 0. Read the other
+# way round, PAWN_ATTACKS[colour >> 3][square] is where the opposing pawns that attack 'square' stand
+PAWN_ATTACKS = [build_targets((-17, -15)), build_targets((15, 17))]
+# The rays from each square in the piece's directions, in the order of the directions
+BISHOP_RAYS = build_rays(BISHOP_DIRECTIONS)
+ROOK_RAYS = build_rays(ROOK_DIRECTIONS)
+QUEEN_RAYS = build_rays(QUEEN_DIRECTIONS)
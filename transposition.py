@@ -0,0 +1,60 @@
+from array import array
+
+# Bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1  # the search failed high, the true score is at least this
+UPPER_BOUND = 2  # the search failed low, the true score is at most this
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by the Zobrist hash of the position.
+
+    Entries are kept in three flat arrays (key, score and the depth/bound/age/move packed into one integer) so the
+    memory used is set by 'size_mb' up front and never grows during a search. Each hash maps to a bucket of two
+    slots: the first keeps the deepest result of the current search and the second always takes the newest one,
+    so a deep entry can't be pushed out by shallow ones near the leaves
+    """
+    ENTRY_SIZE = 24  # bytes per entry, 8 in each array
+
+    def __init__(self, size_mb: float = 16):
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+        self.size = 1 << (entries.bit_length() - 1)  # rounded down to a power of two so indexing is a bit mask
+        self.bucket_mask = self.size - 2  # even index of the first slot of a bucket
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.age = 0
+
+    def new_search(self):
+        # Entries from older searches are replaced first
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.age = 0
+
+    def probe(self, key: int) -> tuple[int, int, int, int | None] | None:
+        """Returns (depth, score, bound, best move) stored for the position, or None if it isn't in the table"""
+        index = key & self.bucket_mask
+        if self.keys[index] != key:
+            index += 1
+            if self.keys[index] != key:
+                return None
+
+        data = self.data[index]
+        return data & 0xFF, self.scores[index], (data >> 8) & 3, (data >> 18) or None
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int | None):
+        index = key & self.bucket_mask
+        data = self.data[index]
+        # Keep the first slot's entry if it is from this search and was searched deeper, unless it is this position
+        if self.keys[index] != key and (data >> 10) & 0xFF == self.age and data & 0xFF > depth:
+            index += 1
+        elif move is None and self.keys[index] == key:
+            move = self.probe(key)[3]  # don't lose the best move of an earlier search of this position
+
+        self.keys[index] = key
+        self.scores[index] = score
+        self.data[index] = depth | bound << 8 | self.age << 10 | (move or 0) << 18  # packed moves are never 0
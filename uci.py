@@ -0,0 +1,289 @@
+import multiprocessing
+import sys
+import threading
+import time
+from typing import TextIO
+from ai import AI, MATE_SCORE, MATE_THRESHOLD, MAX_DEPTH
+from engine import Engine
+from moves import move_name, PROMOTION
+from parallel import ParallelAI
+
+ENGINE_NAME = "Chess by Abu"
+ENGINE_AUTHOR = "Abu"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+DEFAULT_MOVES_TO_GO = 30  # moves the remaining clock time is shared between when the GUI doesn't say
+MOVE_OVERHEAD = 0.05  # seconds kept back on each move for the time it takes the GUI to hear about it
+MIN_MOVE_TIME = 0.01
+
+
+def uci_move(move: int) -> str:
+    """A move in the protocol's coordinate notation, which names the promotion piece, e.g. 'e7e8q'"""
+    return move_name(move) + ("q" if move & PROMOTION else "")
+
+
+def uci_score(score: int) -> str:
+    """A search score as the protocol reports it: centipawns, or moves to mate (negative when being mated)"""
+    if abs(score) > MATE_THRESHOLD:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+def allot_time(remaining: float, increment: float, moves_to_go: int | None) -> float:
+    """Seconds to spend on a move, given the seconds left on the clock and the increment per move"""
+    budget = remaining / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 0.75
+    return max(MIN_MOVE_TIME, min(budget, remaining / 2) - MOVE_OVERHEAD)
+
+
+class UCIEngine:
+    """Speaks the Universal Chess Interface on standard input and output, so the engine can be driven by chess GUIs,
+    tournament managers and scripts without a display.
+
+    Searches run in a background thread so that 'stop' and 'ponderhit' are read while the AI thinks. The engine
+    has no en passant and pawns always promote to a queen, so moves relying on either are refused with an
+    'info string'. The whole 'position' command is then ignored and 'go' answers 'bestmove 0000' until a position
+    that can be played is sent
+    """
+
+    def __init__(self, output: TextIO = sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()  # info lines come from the search thread
+        self.engine: Engine | None = Engine()  # None when the last 'position' couldn't be set up
+        self.hash_size_mb = DEFAULT_HASH_MB
+        self.threads = 1
+        self.ai: AI | None = None  # created on the first search after the options are set
+        self.thread: threading.Thread | None = None
+        self.search_start = 0.0
+        # In an infinite or pondering search the best move may only be sent once the GUI says so, with 'stop' or
+        # 'ponderhit'. When pondering the move's time limit is held back until the GUI confirms the expected reply
+        self.waiting = False
+        self.released = threading.Event()
+        self.ponder_time_limit: float | None = None
+
+    def send(self, text: str):
+        with self.output_lock:
+            self.output.write(text + "\n")
+            self.output.flush()
+
+    def run(self, input_file: TextIO = sys.stdin):
+        """Answers commands until 'quit' or the end of the input"""
+        commands = {"uci": self.uci, "isready": self.isready, "setoption": self.setoption,
+                    "ucinewgame": self.ucinewgame, "position": self.position, "go": self.go, "stop": self.stop,
+                    "ponderhit": self.ponderhit}
+        try:
+            for line in input_file:
+                tokens = line.split()
+                if not tokens:
+                    continue
+                if tokens[0] == "quit":
+                    break
+                if tokens[0] in commands:  # anything else is ignored, as the protocol asks
+                    commands[tokens[0]](tokens[1:])
+        finally:
+            self.stop_search()
+            if isinstance(self.ai, ParallelAI):
+                self.ai.close()
+
+    def uci(self, _):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send(f"id author {ENGINE_AUTHOR}")
+        self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+        self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+        self.send("option name Ponder type check default false")
+        self.send("uciok")
+
+    def isready(self, _):
+        self.send("readyok")
+
+    def setoption(self, tokens: list[str]):
+        # setoption name <name> [value <value>], where the name may contain spaces
+        text = " ".join(tokens)
+        name, _, value = text.removeprefix("name ").partition(" value ")
+        name = name.strip().lower()
+        try:
+            if name == "hash":
+                self.hash_size_mb = min(max(int(value), 1), MAX_HASH_MB)
+            elif name == "threads":
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+            else:
+                return  # the GUI only tells the engine whether it may ponder, 'go ponder' is what matters
+        except ValueError:
+            self.send(f"info string bad value for {name}: {value}")
+            return
+        self.stop_search()
+        self.discard_ai()  # the AI is made again with the new settings
+
+    def ucinewgame(self, _):
+        self.stop_search()
+        self.discard_ai()  # forget the transposition table and move ordering of the last game
+
+    def position(self, tokens: list[str]):
+        # position (startpos | fen <fen>) [moves <move> ...]
+        self.stop_search()
+        self.engine = None  # until the whole command has been played, so a bad one isn't searched half applied
+        moves_index = tokens.index("moves") if "moves" in tokens else len(tokens)
+        try:
+            if tokens and tokens[0] == "fen":
+                engine = Engine.from_fen(" ".join(tokens[1:moves_index]))
+            else:
+                engine = Engine()
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+
+        for text in tokens[moves_index + 1:]:
+            try:
+                move = engine.parse_move(text)
+            except (ValueError, IndexError):
+                move = None
+            # The engine reads the squares only, so the promotion piece has to be checked here
+            if move is None or text[4:] != ("q" if move & PROMOTION else ""):
+                self.send(f"info string can't play {text}")
+                return
+            engine.push(move)
+        self.engine = engine
+
+    def go(self, tokens: list[str]):
+        self.stop_search()
+        if self.engine is None:
+            self.send("bestmove 0000")  # the last 'position' couldn't be set up
+            return
+        limits = {}
+        flags = set()
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token in ("infinite", "ponder"):
+                flags.add(token)
+            elif token == "searchmoves":
+                break  # not supported, the moves that follow are skipped
+            elif index + 1 < len(tokens):
+                try:
+                    limits[token] = int(tokens[index + 1])
+                except ValueError:
+                    pass
+                index += 1
+            index += 1
+
+        # Time limits from the GUI are in milliseconds
+        time_limit = None
+        if "movetime" in limits:
+            time_limit = max(MIN_MOVE_TIME, limits["movetime"] / 1000 - MOVE_OVERHEAD)
+        else:
+            clock, increment = ("wtime", "winc") if self.engine.turn == "white" else ("btime", "binc")
+            if clock in limits:
+                time_limit = allot_time(limits[clock] / 1000, limits.get(increment, 0) / 1000,
+                                        limits.get("movestogo"))
+        if "infinite" in flags:
+            time_limit = None
+
+        self.waiting = bool(flags)
+        self.released.clear()
+        self.ponder_time_limit = None
+        if "ponder" in flags:
+            self.ponder_time_limit, time_limit = time_limit, None
+
+        ai = self.get_ai()
+        ai.engine = self.engine.copy()
+        ai.stop_requested = False
+        self.search_start = time.perf_counter()
+        self.thread = threading.Thread(target=self.search, args=(limits.get("depth", MAX_DEPTH), time_limit,
+                                                                 limits.get("nodes")), daemon=True)
+        self.thread.start()
+
+    def stop(self, _):
+        self.stop_search()
+
+    def ponderhit(self, _):
+        """The opponent made the expected reply, so the pondering search carries on as the real search with the
+        time limit that came with 'go ponder'. If it has already finished its move is sent straight away
+        """
+        if self.thread is None:
+            return
+        if self.ponder_time_limit is not None:
+            self.ai.deadline = time.perf_counter() + self.ponder_time_limit
+        self.waiting = False
+        self.released.set()
+
+    def stop_search(self):
+        """Stops the search if one is running and waits for it to send its move"""
+        if self.thread is not None:
+            self.ai.stop()
+            self.released.set()
+            self.thread.join()
+            self.thread = None
+
+    def search(self, depth: int, time_limit: float | None, node_limit: int | None):
+        ai = self.ai
+        move = ai.get_best_move(depth, time_limit, node_limit)
+        if self.waiting:
+            self.released.wait()
+
+        if move is None:  # stopped before the first iteration finished
+            moves = ai.engine.get_legal_moves()
+            move = moves[0] if moves else None
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        line = self.principal_variation(move, 2)
+        if len(line) > 1:
+            self.send(f"bestmove {uci_move(line[0])} ponder {uci_move(line[1])}")
+        else:
+            self.send(f"bestmove {uci_move(move)}")
+
+    def report(self, depth: int, score: int, move: int | None):
+        """Sends an info line after each iteration of the search"""
+        elapsed = time.perf_counter() - self.search_start
+        nodes = self.ai.nodes
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        text = f"info depth {depth} score {uci_score(score)} nodes {nodes} nps {nps} time {int(elapsed * 1000)}"
+        if move is not None:  # there is no move in checkmate or stalemate
+            text += " pv " + " ".join(uci_move(pv_move) for pv_move in self.principal_variation(move, depth))
+        self.send(text)
+
+    def principal_variation(self, move: int, length: int) -> list[int]:
+        """The best move followed by the expected replies stored in the transposition table, up to 'length' moves.
+        Called from the search thread while the AI's engine is at the root
+        """
+        engine = self.ai.engine
+        line = [move]
+        seen = {engine.hash}
+        engine.push(move)
+        while len(line) < length and engine.hash not in seen:
+            seen.add(engine.hash)
+            entry = self.ai.transposition_table.probe(engine.hash)
+            if entry is None or entry[3] not in engine.get_legal_moves():
+                break
+            line.append(entry[3])
+            engine.push(entry[3])
+        for _ in line:
+            engine.undo_move()
+        return line
+
+    def get_ai(self) -> AI:
+        if self.ai is None:
+            if self.threads > 1:
+                self.ai = ParallelAI(None, MAX_DEPTH, self.engine, workers=self.threads,
+                                     hash_size_mb=self.hash_size_mb)
+            else:
+                self.ai = AI(None, MAX_DEPTH, self.engine, hash_size_mb=self.hash_size_mb)
+            self.ai.on_iteration = self.report
+        return self.ai
+
+    def discard_ai(self):
+        if isinstance(self.ai, ParallelAI):
+            self.ai.close()
+        self.ai = None
+
+
+def main():
+    # Forked worker processes (with Threads above 1) close their copy of standard input on start up, which waits
+    # for the lock held by the main thread while it reads the next command, so workers are started fresh instead
+    multiprocessing.set_start_method("spawn")
+    UCIEngine().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import random
+
+# Random numbers for Zobrist hashing. A position's hash is the xor of the numbers for every (piece, square) pair on
+# the board, its castling rights and (when black is to move) the side key, so a move only has to xor in the few
+# numbers that changed. The generator is seeded so that hashes are the same in every run and every process
+_generator = random.Random(20240101)
+
+# Indexed by piece code then 0x88 square. The EMPTY code's numbers are all 0 so empty squares can be xor-ed freely
+PIECE_KEYS = [[0] * 128] + [[_generator.getrandbits(64) for _ in range(128)] for _ in range(1, 16)]
+CASTLING_KEYS = [_generator.getrandbits(64) for _ in range(16)]  # indexed by the castling rights bit field
+SIDE_KEY = _generator.getrandbits(64)
+
+
+def compute_hash(squares: list[int], side: int, castling_rights: int) -> int:
+    """Hashes a position from scratch. The engine only needs this when a position is set up, after that the hash is
+    updated incrementally as moves are made
+    """
+    key = CASTLING_KEYS[castling_rights]
+    if side:
+        key ^= SIDE_KEY
+    for square, piece in enumerate(squares):
+        key ^= PIECE_KEYS[piece][square]
+    return key